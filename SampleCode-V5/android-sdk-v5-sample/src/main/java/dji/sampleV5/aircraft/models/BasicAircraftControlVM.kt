@@ -1,5 +1,6 @@
 package dji.sampleV5.aircraft.models
 
+import android.graphics.Bitmap
 import androidx.lifecycle.MutableLiveData
 import dji.sampleV5.aircraft.util.ToastUtils
 import dji.sdk.keyvalue.key.FlightControllerKey
@@ -24,7 +25,9 @@ import io.ktor.features.CallLogging
 import io.ktor.features.ContentNegotiation
 import io.ktor.gson.gson
 import io.ktor.http.ContentType
+import io.ktor.response.header
 import io.ktor.response.respond
+import io.ktor.response.respondBytes
 import io.ktor.response.respondText
 import io.ktor.routing.Route
 import io.ktor.routing.get
@@ -32,6 +35,8 @@ import io.ktor.routing.routing
 import io.ktor.server.engine.embeddedServer
 import io.ktor.server.netty.Netty
 import io.ktor.websocket.WebSockets
+import java.io.ByteArrayOutputStream
+import java.nio.ByteBuffer
 
 
 class BasicAircraftControlVM : DJIViewModel() {
@@ -110,6 +115,16 @@ class BasicAircraftControlVM : DJIViewModel() {
         VirtualStickManager.getInstance().rightStick.horizontalPosition = 0
     }
 
+    private fun myRgbaToJpeg(data: ByteArray, width: Int, height: Int, quality: Int): ByteArray {
+        // ARGB_8888 bitmaps are stored as RGBA bytes, so the frame can be copied as is
+        val bitmap = Bitmap.createBitmap(width, height, Bitmap.Config.ARGB_8888)
+        bitmap.copyPixelsFromBuffer(ByteBuffer.wrap(data, 0, width * height * 4))
+        val stream = ByteArrayOutputStream()
+        bitmap.compress(Bitmap.CompressFormat.JPEG, quality, stream)
+        bitmap.recycle()
+        return stream.toByteArray()
+    }
+
     private fun myEnableVirtualStick() {
         val currentVirtualStickStateInfo = MutableLiveData(VirtualStickVM.VirtualStickStateInfo())
         VirtualStickManager.getInstance().setVirtualStickStateListener(object :
@@ -234,6 +249,20 @@ class BasicAircraftControlVM : DJIViewModel() {
             call.respond(DroneState(globalData, globalWidth, globalHeight))
         }
 
+        // Binary variants of /CameraStream, the frame size is sent in headers instead of a JSON body
+        get("/CameraStream/Raw") {
+            call.response.header("X-Frame-Width", globalWidth.toString())
+            call.response.header("X-Frame-Height", globalHeight.toString())
+            call.respondBytes(globalData, ContentType.Application.OctetStream)
+        }
+
+        get("/CameraStream/Jpeg/{quality}") {
+            val jpeg = myRgbaToJpeg(globalData, globalWidth, globalHeight, call.parameters["quality"]!!.toInt())
+            call.response.header("X-Frame-Width", globalWidth.toString())
+            call.response.header("X-Frame-Height", globalHeight.toString())
+            call.respondBytes(jpeg, ContentType.Image.JPEG)
+        }
+
         get("/StartCameraStream") {
             CameraStreamManager.getInstance().addFrameListener(ComponentIndexType.LEFT_OR_MAIN, ICameraStreamManager.FrameFormat.RGBA_8888, object :
                 ICameraStreamManager.CameraFrameListener {
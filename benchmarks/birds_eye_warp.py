@@ -0,0 +1,54 @@
+"""
+Times the bird's-eye warp with and without BirdsEyeWarpCache, run from the repository root:
+    python -m benchmarks.birds_eye_warp
+"""
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from image_processing.birds_eye import apply_birds_eye, BirdsEyeWarpCache
+
+FRAME_SIZES = ((1080, 1920), (2800, 4000))
+REPEATS = 10
+
+
+def _synthetic_frame(height, width):
+    frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    corners = np.array([[0.15 * width, 0.15 * height], [0.85 * width, 0.14 * height],
+                        [0.84 * width, 0.85 * height], [0.16 * width, 0.83 * height]], dtype="float32")
+    return frame, corners
+
+
+def _time_ms(action, repeats=REPEATS):
+    action()
+    start = perf_counter()
+    for _ in range(repeats):
+        action()
+    return (perf_counter() - start) / repeats * 1000
+
+
+def benchmark_warp(height, width):
+    """
+    Returns the mean time in ms of a cv2.warpPerspective warp, a cache miss (building the remap tables and warping)
+    and a cache hit for a frame of the given size.
+    """
+    frame, corners = _synthetic_frame(height, width)
+    warp_cache = BirdsEyeWarpCache()
+
+    def cache_miss():
+        warp_cache.clear()
+        apply_birds_eye(frame, corners, warp_cache=warp_cache)
+
+    warp_perspective = _time_ms(lambda: apply_birds_eye(frame, corners))
+    miss = _time_ms(cache_miss)
+    hit = _time_ms(lambda: apply_birds_eye(frame, corners, warp_cache=warp_cache))
+    return warp_perspective, miss, hit
+
+
+if __name__ == "__main__":
+    print(f"OpenCV {cv2.__version__}, {cv2.getNumThreads()} threads")
+    print(f"{'frame':<12}{'warpPerspective':>17}{'cache miss':>12}{'cache hit':>11}")
+    for frame_height, frame_width in FRAME_SIZES:
+        warp_perspective, miss, hit = benchmark_warp(frame_height, frame_width)
+        print(f"{f'{frame_height}x{frame_width}':<12}{warp_perspective:>17.1f}{miss:>12.1f}{hit:>11.1f}")
@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 
 # PAY ATTENTION!
@@ -24,8 +26,31 @@ DESTINATION_UPPER_BOUND2 = np.array([140, 255, 255])
 
 MIN_CONTOUR_AREA = 100
 
+# Labels of the categorized birds eye matrix
+BACKGROUND_LABEL = 0
+OBSTACLE_LABEL = 1
+DESTINATION_LABEL = 2
+
+# Compiled lookup tables of the color ranges above, rebuilt whenever the ranges change. Kept next to the packages
+# rather than in the working directory
+COLOR_MODEL_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "color_model.npz")
+
 BIRDS_EYE_MARGIN = 0
 
+# Cost-map planning: entering a cell costs 1, plus up to COST_MAP_PENALTY for cells closer than COST_MAP_PENALTY_RANGE
+# cells to an obstacle or to the boundary lines
+COST_MAP_PENALTY = 3.0
+COST_MAP_PENALTY_RANGE = 3.0
+
+# A captured frame is accepted once it is sharp (variance of Laplacian) and the boundary markers moved less than
+# FRAME_MAX_CORNER_SHIFT pixels since the previous frame, or STABLE_FRAME_TIMEOUT seconds passed
+FRAME_MIN_SHARPNESS = 20.0
+FRAME_MAX_CORNER_SHIFT = 3.0
+STABLE_FRAME_TIMEOUT = 10
+
+# Boundary corners closer than this (in pixels) to a previous frame's corners reuse its bird's-eye warp
+BIRDS_EYE_CORNER_QUANTIZATION = 8
+
 JEEP_HEIGHT = 35
 JEEP_WIDTH = 24
 JEEP_SIZE = max(JEEP_WIDTH, JEEP_HEIGHT)
@@ -38,3 +63,17 @@ STEP_SIZE_X = 0.35
 STEP_SIZE_Y = 0.35
 STEP_SIZE = 0.35
 XY_SPEED = 0.6
+# Distance (m) from the planned position above which the jeep corrects its drift
+DRIFT_TOLERANCE = 0.05
+
+# Trajectory following: the path is driven at up to XY_SPEED (m/s) accelerating at up to JEEP_MAX_ACCELERATION
+# (m/s^2), the speed is commanded TRAJECTORY_CONTROL_RATE times a second and the position error (m) is corrected
+# with TRAJECTORY_POSITION_GAIN (1/s) until it is below TRAJECTORY_GOAL_TOLERANCE at the end
+JEEP_MAX_ACCELERATION = 0.5
+TRAJECTORY_CONTROL_RATE = 20
+TRAJECTORY_POSITION_GAIN = 1.5
+TRAJECTORY_GOAL_TOLERANCE = 0.03
+
+# "show" opens a blocking window per plot, "save" writes them to PLOTS_OUTPUT_DIR in the background, "off" skips them
+PLOT_MODE = "show"
+PLOTS_OUTPUT_DIR = "plots"
@@ -0,0 +1,283 @@
+import asyncio
+import json
+from time import monotonic
+from typing import Any, Dict, NamedTuple
+
+import numpy as np
+
+from drone.drone_io import DroneController, FRAME_TRANSPORTS, CONNECT_TIMEOUT, COMMAND_READ_TIMEOUT, \
+    FRAME_BUFFER_CAPACITY
+from config.constants import STABLE_FRAME_TIMEOUT
+from drone.frame_buffer import FrameRingBuffer
+from image_processing.frame_quality import FrameQualityGate
+
+# A connection closed by the server while idle fails on its next request before any response byte arrives
+_STALE_CONNECTION_ERRORS = (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError)
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    keep_alive: bool
+
+    def json(self) -> Dict[str, Any]:
+        return json.loads(self.body)
+
+
+class AsyncHttpClient:
+    """
+    Minimal keep-alive HTTP/1.1 GET client on asyncio streams.
+    Up to max_connections requests run concurrently, each on its own connection, and finished connections are
+    kept open for the next requests.
+    """
+
+    def __init__(self, host: str, port: int, max_connections: int = 4) -> None:
+        self.host = host
+        self.port = port
+        self._idle_connections = []
+        self._connection_slots = asyncio.Semaphore(max_connections)
+
+    async def _open_connection(self):
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+
+    @staticmethod
+    async def _read_chunked_body(reader) -> bytes:
+        chunks = []
+        while True:
+            chunk_size = int((await reader.readline()).split(b";")[0], 16)
+            if chunk_size == 0:
+                # Skip the trailer headers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readexactly(2)
+
+    async def _exchange(self, reader, writer, route: str) -> HttpResponse:
+        writer.write(f"GET {route} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nConnection: keep-alive\r\n\r\n"
+                     .encode("latin-1"))
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("The drone closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked_body(reader)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return HttpResponse(status=status, headers=headers, body=body, keep_alive=keep_alive)
+
+    async def get(self, route: str, timeout: float) -> HttpResponse:
+        async with self._connection_slots:
+            reused = bool(self._idle_connections)
+            reader, writer = self._idle_connections.pop() if reused else await self._open_connection()
+            try:
+                response = await asyncio.wait_for(self._exchange(reader, writer, route), timeout)
+            except _STALE_CONNECTION_ERRORS:
+                writer.close()
+                if not reused:
+                    raise
+                reader, writer = await self._open_connection()
+                try:
+                    response = await asyncio.wait_for(self._exchange(reader, writer, route), timeout)
+                except BaseException:
+                    writer.close()
+                    raise
+            except BaseException:
+                writer.close()
+                raise
+            if response.keep_alive:
+                self._idle_connections.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def close(self) -> None:
+        while self._idle_connections:
+            _, writer = self._idle_connections.pop()
+            writer.close()
+
+
+class AsyncDroneController:
+    """
+    Non-blocking counterpart of DroneController for use with asyncio.
+    Commands are awaited instead of followed by fixed sleeps: move routes answer once the move ends, so awaiting them
+    is awaiting the move. Independent commands can run concurrently (e.g. asyncio.gather), and frame polling keeps
+    pulling the camera stream on its own connection while commands are in flight.
+    """
+
+    def __init__(self, ip: str, port: int, frame_transport: str = "raw", jpeg_quality: int = 90) -> None:
+        if frame_transport not in FRAME_TRANSPORTS:
+            raise ValueError(f"Unknown frame transport '{frame_transport}', expected one of {FRAME_TRANSPORTS}")
+        self.ip = ip
+        self.port = port
+        self.frame_transport = frame_transport
+        self.jpeg_quality = jpeg_quality
+        self.frames = FrameRingBuffer(FRAME_BUFFER_CAPACITY)
+        self._client = None
+        self._frame_polling = None
+
+    async def connect(self) -> "AsyncDroneController":
+        self._client = AsyncHttpClient(self.ip, self.port)
+        r = await self._client.get('/', COMMAND_READ_TIMEOUT)
+        assert r.body == b"Connected"
+        await self.enable()
+        await self.startcamerastream()
+        return self
+
+    async def close(self) -> None:
+        await self.stop_frame_polling()
+        await self._client.close()
+
+    async def __aenter__(self) -> "AsyncDroneController":
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _get(self, route: str, read_timeout=None) -> HttpResponse:
+        _, read_timeout = DroneController._route_timeout(route, read_timeout)
+        return await self._client.get(route, CONNECT_TIMEOUT + read_timeout)
+
+    async def makeReqAndReturnJSON(self, route: str, read_timeout=None) -> Dict[str, Any]:
+        return (await self._get(route, read_timeout)).json()
+
+    async def _move(self, route: str, time_ms: int) -> Dict[str, Any]:
+        return await self.makeReqAndReturnJSON(route, read_timeout=time_ms / 1000 + COMMAND_READ_TIMEOUT)
+
+    async def enable(self) -> Dict[str, Any]:
+        return await self.makeReqAndReturnJSON('/Enable')
+
+    async def disable(self) -> Dict[str, Any]:
+        return await self.makeReqAndReturnJSON('/Disable')
+
+    async def takeOff(self) -> Dict[str, Any]:
+        return await self.makeReqAndReturnJSON('/TakeOff')
+
+    async def land(self) -> Dict[str, Any]:
+        for i in range(10):
+            await self.makeReqAndReturnJSON('/Land')
+            await asyncio.sleep(1)
+        return await self.makeReqAndReturnJSON('/Land')
+
+    async def moveup(self, param, time) -> Dict[str, Any]:
+        time = round(1000 * time)
+        return await self._move(f'/MoveUp/{param}/{time}', time)
+
+    async def rotatecamera(self, angle) -> Dict[str, Any]:
+        return await self.makeReqAndReturnJSON(f'/RotateCamera/{angle}')
+
+    async def moveforward(self, forward, right, time) -> Dict[str, Any]:
+        time = round(1000 * time)
+        return await self._move(f'/MoveForward/{forward}/{right}/{time}', time)
+
+    async def rotate(self, param, time) -> Dict[str, Any]:
+        time = round(1000 * time)
+        return await self._move(f'/Rotate/{param}/{time}', time)
+
+    async def movesideways(self, param, time) -> Dict[str, Any]:
+        time = round(1000 * time)
+        return await self._move(f'/MoveSideways/{param}/{time}', time)
+
+    async def startcamerastream(self) -> Dict[str, Any]:
+        return await self.makeReqAndReturnJSON('/StartCameraStream')
+
+    async def camerastream(self) -> Dict[str, Any]:
+        return await self.makeReqAndReturnJSON('/CameraStream')
+
+    async def camerastream_frame(self) -> np.ndarray:
+        """
+        Fetches the latest camera frame as a (height, width, 4) uint8 RGBA array, see DroneController.
+        Decoding runs in a worker thread so that it does not stall the commands in flight.
+        """
+        if self.frame_transport != "json":
+            if self.frame_transport == "raw":
+                route = '/CameraStream/Raw'
+            else:
+                route = f'/CameraStream/Jpeg/{self.jpeg_quality}'
+            r = await self._get(route)
+            if r.status == 404:
+                print(f"The drone does not support {self.frame_transport} frames, falling back to json")
+                self.frame_transport = "json"
+            elif r.status != 200:
+                raise ConnectionError(f"The drone answered {r.status} to {route}")
+            elif self.frame_transport == "jpeg":
+                return await asyncio.to_thread(DroneController.decode_jpeg_image, r.body)
+            else:
+                return DroneController.decode_raw_rgba_image(r.body, int(r.headers["x-frame-width"]),
+                                                             int(r.headers["x-frame-height"]))
+        r = await self._get('/CameraStream')
+        camera_stream = await asyncio.to_thread(r.json)
+        return await asyncio.to_thread(DroneController.decode_rgba_image, camera_stream["state"],
+                                       camera_stream['width'], camera_stream['height'])
+
+    async def _poll_frames(self, interval) -> None:
+        while True:
+            try:
+                self.frames.push(await self.camerastream_frame())
+            except Exception as e:
+                # No frame yet, a dropped or cut request or an unexpected response (e.g. JSON without the frame), a
+                # failed poll must not end the task silently, the next poll tries again
+                print(f"Frame polling failed: {e!r}")
+            await asyncio.sleep(interval)
+
+    def start_frame_polling(self, interval: float = 0.2) -> None:
+        """
+        Keeps pushing frames into self.frames in the background until stop_frame_polling.
+        """
+        if self._frame_polling is None:
+            self._frame_polling = asyncio.create_task(self._poll_frames(interval))
+
+    def latest_frame(self, max_age: float = None, copy: bool = True):
+        return self.frames.latest(max_age=max_age, copy=copy)
+
+    async def capture_stable_frame(self, gate=None, timeout=STABLE_FRAME_TIMEOUT) -> np.ndarray:
+        """
+        Samples frames until the gate accepts one, see DroneController.capture_stable_frame.
+        Frames are taken from frame polling when it runs, and checked in a worker thread.
+        """
+        gate = gate or FrameQualityGate()
+        deadline = monotonic() + timeout
+        last_complete_frame = None
+        checked_frames = None
+        while monotonic() < deadline:
+            if self._frame_polling is not None:
+                pushed_frames = self.frames.pushed_frames
+                frame = self.latest_frame()
+                if frame is None or pushed_frames == checked_frames:
+                    await asyncio.sleep(0.02)
+                    continue
+                checked_frames = pushed_frames
+            else:
+                frame = await self.camerastream_frame()
+            quality = await asyncio.to_thread(gate.check, frame)
+            if quality.boundaries is not None:
+                last_complete_frame = frame
+            if quality.accepted:
+                return frame
+            print(f"Frame rejected: {quality.reason}")
+        if last_complete_frame is None:
+            raise TimeoutError("No frame showed all the boundary markers")
+        print("No stable frame in time, using the last frame showing all the boundary markers")
+        return last_complete_frame
+
+    async def stop_frame_polling(self) -> None:
+        if self._frame_polling is not None:
+            self._frame_polling.cancel()
+            try:
+                await self._frame_polling
+            except asyncio.CancelledError:
+                pass
+            self._frame_polling = None
@@ -1,25 +1,88 @@
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, monotonic
 from typing import Any, Dict
 
+import cv2
 import numpy as np
 import requests
 from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config.constants import STABLE_FRAME_TIMEOUT
+from drone.frame_buffer import FrameGrabber
+from image_processing.frame_quality import FrameQualityGate
+
+# "json" is the original /CameraStream list of ints, "raw" and "jpeg" are binary routes of the Android bridge
+FRAME_TRANSPORTS = ("json", "raw", "jpeg")
+
+CONNECT_TIMEOUT = 3.05
+COMMAND_READ_TIMEOUT = 5
+# Read timeouts in seconds by the first part of the route, frames are large and the gimbal takes a while to turn.
+# Move routes block until the move ends, so their read timeout is the move time plus COMMAND_READ_TIMEOUT.
+ROUTE_READ_TIMEOUTS = {
+    '/CameraStream': 15,
+    '/RotateCamera': 10,
+    '/TakeOff': 10,
+}
+# Only failed connections are retried, a command that reached the drone must not be sent twice
+CONNECT_RETRIES = 3
+# Number of decoded frames kept by the frame grabber
+FRAME_BUFFER_CAPACITY = 3
 
 
 class DroneController:
-    def __init__(self, ip: str, port: int) -> None:
+    def __init__(self, ip: str, port: int, frame_transport: str = "raw", jpeg_quality: int = 90) -> None:
+        if frame_transport not in FRAME_TRANSPORTS:
+            raise ValueError(f"Unknown frame transport '{frame_transport}', expected one of {FRAME_TRANSPORTS}")
         self.ip = ip
         self.port = port
+        self.frame_transport = frame_transport
+        self.jpeg_quality = jpeg_quality
         self.server_addr = f"http://{self.ip}:{self.port}"
-        r = requests.get(url=self.server_addr)
+        self.session = self._create_session()
+        r = self.session.get(url=self.server_addr, timeout=(CONNECT_TIMEOUT, COMMAND_READ_TIMEOUT))
         assert r.content == b"Connected"
+        self._image_writer = None
+        self._frame_grabber = None
         self.enable()
         self.startcamerastream()
 
-    def makeReqAndReturnJSON(self, route: str) -> Dict[str, Any]:
-        r = requests.get(url=f"{self.server_addr}{route}")
+    @staticmethod
+    def _create_session() -> requests.Session:
+        """
+        A single keep-alive session for all the routes, so commands reuse the pooled connections instead of opening
+        a new TCP connection each time.
+        """
+        session = requests.Session()
+        retries = Retry(total=CONNECT_RETRIES, connect=CONNECT_RETRIES, read=0, status=0, other=0,
+                        backoff_factor=0.1, allowed_methods=["GET"])
+        session.mount("http://", HTTPAdapter(max_retries=retries, pool_connections=1, pool_maxsize=4))
+        return session
+
+    @staticmethod
+    def _route_timeout(route: str, read_timeout=None):
+        if read_timeout is None:
+            read_timeout = ROUTE_READ_TIMEOUTS.get('/' + route.split('/')[1], COMMAND_READ_TIMEOUT)
+        return CONNECT_TIMEOUT, read_timeout
+
+    def _get(self, route: str, read_timeout=None) -> requests.Response:
+        return self.session.get(url=f"{self.server_addr}{route}", timeout=self._route_timeout(route, read_timeout))
+
+    def makeReqAndReturnJSON(self, route: str, read_timeout=None) -> Dict[str, Any]:
+        r = self._get(route, read_timeout)
         return r.json()
 
+    def _move(self, route: str, time_ms: int) -> Dict[str, Any]:
+        return self.makeReqAndReturnJSON(route, read_timeout=time_ms / 1000 + COMMAND_READ_TIMEOUT)
+
+    def close(self) -> None:
+        self.stop_frame_grabber()
+        self.session.close()
+        if self._image_writer is not None:
+            self._image_writer.shutdown(wait=True)
+            self._image_writer = None
+
     def enable(self) -> Dict[str, Any]:
         return self.makeReqAndReturnJSON('/Enable')
 
@@ -37,14 +100,14 @@ class DroneController:
 
     def moveup(self, param, time) -> Dict[str, Any]:
         time = round(1000 * time)
-        return self.makeReqAndReturnJSON(f'/MoveUp/{param}/{time}')
+        return self._move(f'/MoveUp/{param}/{time}', time)
 
     def rotatecamera(self, angle) -> Dict[str, Any]:
         return self.makeReqAndReturnJSON(f'/RotateCamera/{angle}')
 
     def moveforward(self, forward, right, time) -> Dict[str, Any]:
         time = round(1000 * time)
-        return self.makeReqAndReturnJSON(f'/MoveForward/{forward}/{right}/{time}')
+        return self._move(f'/MoveForward/{forward}/{right}/{time}', time)
         """forward = -forward//2
         right = -right//2
         time = 100
@@ -52,11 +115,11 @@ class DroneController:
 
     def rotate(self, param, time) -> Dict[str, Any]:
         time = round(1000 * time)
-        return self.makeReqAndReturnJSON(f'/Rotate/{param}/{time}')
+        return self._move(f'/Rotate/{param}/{time}', time)
 
     def movesideways(self, param, time) -> Dict[str, Any]:
         time = round(1000 * time)
-        return self.makeReqAndReturnJSON(f'/MoveSideways/{param}/{time}')
+        return self._move(f'/MoveSideways/{param}/{time}', time)
 
     def startcamerastream(self) -> Dict[str, Any]:
         return self.makeReqAndReturnJSON('/StartCameraStream')
@@ -67,23 +130,154 @@ class DroneController:
     def stopcamerastream(self) -> Dict[str, Any]:
         return self.makeReqAndReturnJSON('/StopCameraStream')
 
-    def capture_and_save_rgba_image(self, save_to_path) -> Dict[str, Any]:
+    def camerastream_frame(self) -> np.ndarray:
+        """
+        Fetches the latest camera frame as a (height, width, 4) uint8 RGBA array using the frame transport.
+        A bridge without the binary routes answers 404, the controller then falls back to json for good.
+        """
+        if self.frame_transport != "json":
+            if self.frame_transport == "raw":
+                route = '/CameraStream/Raw'
+            else:
+                route = f'/CameraStream/Jpeg/{self.jpeg_quality}'
+            r = self._get(route)
+            if r.status_code == 404:
+                print(f"The drone does not support {self.frame_transport} frames, falling back to json")
+                self.frame_transport = "json"
+            else:
+                r.raise_for_status()
+                if self.frame_transport == "jpeg":
+                    return self.decode_jpeg_image(r.content)
+                return self.decode_raw_rgba_image(r.content, int(r.headers["X-Frame-Width"]),
+                                                  int(r.headers["X-Frame-Height"]))
+        camera_stream = self.camerastream()
+        return self.decode_rgba_image(camera_stream["state"], camera_stream['width'], camera_stream['height'])
+
+    def start_frame_grabber(self, capacity=FRAME_BUFFER_CAPACITY, interval=0.0) -> None:
+        """
+        Keeps pulling frames in a background thread into a ring buffer of the latest `capacity` frames.
+        :param interval: seconds to wait between frames, 0 pulls them back to back.
+        """
+        if self._frame_grabber is None:
+            self._frame_grabber = FrameGrabber(self.camerastream_frame, capacity=capacity, interval=interval)
+            self._frame_grabber.start()
+
+    def stop_frame_grabber(self) -> None:
+        if self._frame_grabber is not None:
+            self._frame_grabber.stop()
+            self._frame_grabber = None
+
+    def latest_frame(self, max_age=None, copy=True):
+        """
+        Returns the freshest grabbed frame, or None if the grabber is not running, has no frame yet or the frame is
+        older than max_age seconds.
+        """
+        if self._frame_grabber is None:
+            return None
+        return self._frame_grabber.latest_frame(max_age=max_age, copy=copy)
+
+    def capture_rgba_image(self, save_to_path=None, max_age=None) -> np.ndarray:
+        """
+        Captures a single frame of the camera stream as a (height, width, 4) uint8 RGBA array.
+        When the frame grabber runs, its freshest frame is taken instead of requesting a new one.
+        :param save_to_path: optional path to also save the frame to, written in the background.
+        :param max_age: seconds after which a grabbed frame is too old and a new one is requested.
+        """
+        rgba_array = self.latest_frame(max_age=max_age)
+        if rgba_array is None:
+            rgba_array = self.camerastream_frame()
+        if save_to_path:
+            self.save_rgba_image_async(rgba_array, save_to_path)
+        return rgba_array
+
+    def capture_stable_frame(self, gate=None, timeout=STABLE_FRAME_TIMEOUT, save_to_path=None) -> np.ndarray:
+        """
+        Samples frames until the gate accepts one, instead of sleeping a fixed time for the hover to settle.
+        New frames are taken from the frame grabber when it runs, otherwise they are requested one by one.
+        When the timeout expires the last frame showing all the boundary markers is returned.
+        :param gate: FrameQualityGate, a default one if not given.
+        :param save_to_path: optional path to also save the frame to, written in the background.
+        """
+        gate = gate or FrameQualityGate()
+        deadline = monotonic() + timeout
+        last_complete_frame = None
+        checked_frames = None
+        while monotonic() < deadline:
+            if self._frame_grabber is not None:
+                pushed_frames = self._frame_grabber.frames.pushed_frames
+                frame = self.latest_frame()
+                if frame is None or pushed_frames == checked_frames:
+                    sleep(0.02)
+                    continue
+                checked_frames = pushed_frames
+            else:
+                frame = self.camerastream_frame()
+            quality = gate.check(frame)
+            if quality.boundaries is not None:
+                last_complete_frame = frame
+            if quality.accepted:
+                break
+            print(f"Frame rejected: {quality.reason}")
+        else:
+            if last_complete_frame is None:
+                raise TimeoutError("No frame showed all the boundary markers")
+            print("No stable frame in time, using the last frame showing all the boundary markers")
+        if save_to_path:
+            self.save_rgba_image_async(last_complete_frame, save_to_path)
+        return last_complete_frame
+
+    def save_rgba_image_async(self, rgba_array, output_filename):
+        """
+        Saves the frame from a background thread so that encoding the PNG does not delay the caller.
+        :return: Future of the write.
+        """
+        if self._image_writer is None:
+            self._image_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="drone_image_writer")
+        return self._image_writer.submit(self.save_rgba_image, rgba_array, output_filename)
+
+    def capture_and_save_rgba_image(self, save_to_path=None) -> Dict[str, Any]:
         camera_stream = self.camerastream()
         print("Image Captured")
         sleep(5)
-        image = camera_stream["state"]
-        for i in range(len(image)):
-            if image[i] < 0:
-                image[i] += 256
+        camera_stream['image'] = self.decode_rgba_image(camera_stream["state"], camera_stream['width'],
+                                                        camera_stream['height'])
         print("Fixed Image Values")
-        camera_stream['image'] = image
-        self.save_rgba_image_from_int_list(image, camera_stream['width'], camera_stream['height'], save_to_path)
+        if save_to_path:
+            self.save_rgba_image(camera_stream['image'], save_to_path)
         return camera_stream
 
     @staticmethod
-    def save_rgba_image_from_int_list(int_list, width, height, output_filename):
+    def decode_rgba_image(int_list, width, height) -> np.ndarray:
+        """
+        Converts the camera stream values into a (height, width, 4) uint8 RGBA array in a single vectorized step.
+        The Android bridge sends the bytes as signed values (Java bytes), masking the low byte maps -1 back to 255.
+        """
         if len(int_list) != width * height * 4:
             raise ValueError("The length of the int_list does not match the expected dimensions of the image.")
-        rgba_array = np.array(int_list, dtype=np.uint8).reshape((height, width, 4))
+        return (np.asarray(int_list, dtype=np.int16) & 0xFF).astype(np.uint8).reshape((height, width, 4))
+
+    @staticmethod
+    def decode_raw_rgba_image(content, width, height) -> np.ndarray:
+        """
+        Views the raw RGBA bytes as a (height, width, 4) uint8 array without copying them (the array is read only).
+        """
+        if len(content) != width * height * 4:
+            raise ValueError("The length of the frame does not match the expected dimensions of the image.")
+        return np.frombuffer(content, dtype=np.uint8).reshape((height, width, 4))
+
+    @staticmethod
+    def decode_jpeg_image(content) -> np.ndarray:
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("The frame is not a valid JPEG image.")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+
+    @staticmethod
+    def save_rgba_image(rgba_array, output_filename):
         image = Image.fromarray(rgba_array, 'RGBA')
         image.save(output_filename)
+
+    @staticmethod
+    def save_rgba_image_from_int_list(int_list, width, height, output_filename):
+        rgba_array = DroneController.decode_rgba_image(int_list, width, height)
+        DroneController.save_rgba_image(rgba_array, output_filename)
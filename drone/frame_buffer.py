@@ -0,0 +1,92 @@
+import threading
+from time import monotonic, sleep
+
+import numpy as np
+
+
+class FrameRingBuffer:
+    """
+    Keeps the latest `capacity` frames in preallocated arrays.
+    Frames are copied into the slot after the newest one, so a stream of frames of the same size never allocates.
+    The slots are (re)allocated only when the frame size changes.
+    """
+
+    def __init__(self, capacity: int = 3) -> None:
+        if capacity < 1:
+            raise ValueError("The frame buffer must hold at least one frame")
+        self.capacity = capacity
+        self._slots = None
+        self._timestamps = np.zeros(capacity)
+        self._newest = -1
+        self.pushed_frames = 0
+        self._lock = threading.Lock()
+
+    def push(self, frame: np.ndarray) -> None:
+        with self._lock:
+            if self._slots is None or self._slots.shape[1:] != frame.shape or self._slots.dtype != frame.dtype:
+                self._slots = np.empty((self.capacity, *frame.shape), dtype=frame.dtype)
+                self._newest = -1
+            slot = (self._newest + 1) % self.capacity
+            np.copyto(self._slots[slot], frame)
+            self._timestamps[slot] = monotonic()
+            self._newest = slot
+            self.pushed_frames += 1
+
+    def latest(self, max_age: float = None, copy: bool = True):
+        """
+        Returns the newest frame, or None if there is none or it is older than max_age seconds.
+        Without copy the frame is a view of its slot, valid until `capacity - 1` more frames are pushed.
+        """
+        with self._lock:
+            if self._newest == -1:
+                return None
+            if max_age is not None and monotonic() - self._timestamps[self._newest] > max_age:
+                return None
+            frame = self._slots[self._newest]
+            return frame.copy() if copy else frame
+
+    def clear(self) -> None:
+        with self._lock:
+            self._newest = -1
+
+
+class FrameGrabber:
+    """
+    Background thread pulling frames with `fetch_frame` into a FrameRingBuffer, so the freshest frame is always at
+    hand. A slow consumer simply misses the older frames.
+    """
+
+    def __init__(self, fetch_frame, capacity: int = 3, interval: float = 0.0) -> None:
+        self.fetch_frame = fetch_frame
+        self.interval = interval
+        self.frames = FrameRingBuffer(capacity)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.frames.push(self.fetch_frame())
+            except Exception as e:
+                # No frame yet, a dropped request or an unexpected response (e.g. JSON without the frame), a failed
+                # fetch must not end the thread silently, the next fetch tries again
+                print(f"Frame grabbing failed: {e!r}")
+                sleep(max(self.interval, 0.1))
+                continue
+            if self.interval:
+                self._stop_event.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="frame_grabber", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def latest_frame(self, max_age: float = None, copy: bool = True):
+        return self.frames.latest(max_age=max_age, copy=copy)
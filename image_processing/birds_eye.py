@@ -1,11 +1,16 @@
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 
-from config.constants import BIRDS_EYE_MARGIN
-from image_processing.plot_utils import plot_image
+from config.constants import BIRDS_EYE_MARGIN, BIRDS_EYE_CORNER_QUANTIZATION
+from image_processing.plot_utils import plot_image, plots_enabled
+
+# Side of the blocks min-pooled at full resolution by apply_min_pooled_birds_eye
+MIN_POOL_BLOCK_SIZE = 4
 
 
-def apply_birds_eye(drone_img: np.array, coordinates):
+def _birds_eye_size(coordinates):
     # L2 norm
     tl, tr, br, bl = coordinates[0], coordinates[1], coordinates[2], coordinates[3]
     # width
@@ -16,6 +21,23 @@ def apply_birds_eye(drone_img: np.array, coordinates):
     height_a = np.sqrt(((tr[0] - br[0]) ** 2) + ((tr[1] - br[1]) ** 2))
     height_b = np.sqrt(((tl[0] - bl[0]) ** 2) + ((tl[1] - bl[1]) ** 2))
     max_height = max(int(height_a), int(height_b))
+    return max_width, max_height
+
+
+def get_birds_eye_size(coordinates):
+    """
+    Returns the (width, height) of the full resolution bird's-eye view of the coordinates, after the margin crop.
+    """
+    max_width, max_height = _birds_eye_size(coordinates)
+    return max_width - 2 * BIRDS_EYE_MARGIN, max_height - 2 * BIRDS_EYE_MARGIN
+
+
+def _birds_eye_transform(coordinates, scale=1.0):
+    """
+    Returns the perspective transform matrix mapping the ordered boundary coordinates to a bird's-eye view,
+    cropped by the margin and resized by scale, and the size of that view.
+    """
+    max_width, max_height = _birds_eye_size(coordinates)
     # Destination points which will map the image to a bird's-eye view
     destination = np.array([[0, 0],
                             [max_width - 1, 0],
@@ -25,20 +47,136 @@ def apply_birds_eye(drone_img: np.array, coordinates):
                            dtype="float32")
     # Compute the perspective transform matrix
     M = cv2.getPerspectiveTransform(np.array(coordinates, dtype="float32"), destination)
+    # Crop the margin and resize as part of the transform, keeping the pixel centers of both sizes aligned
+    offset = scale * (0.5 - BIRDS_EYE_MARGIN) - 0.5
+    M = np.array([[scale, 0, offset], [0, scale, offset], [0, 0, 1]]) @ M
+    width, height = get_birds_eye_size(coordinates)
+    return M, int(np.ceil(width * scale)), int(np.ceil(height * scale))
+
+
+def get_birds_eye_sampling_radius(coordinates, scale=1.0):
+    """
+    Returns how far (per axis, in source pixels) a source pixel can be from the nearest pixel sampled by a
+    bird's-eye view of the coordinates at the given scale. Below 1 nearest sampling reads every source pixel, above
+    it small features can fall between the samples.
+    """
+    M, width, height = _birds_eye_transform(coordinates, scale)
+    x, y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    samples = cv2.perspectiveTransform(np.dstack((x, y)), np.linalg.inv(M))
+    # Steps between neighboring samples along the view rows and columns, a source pixel lies inside a cell of
+    # samples and is at most half of both steps away from one of its corners
+    row_steps = np.abs(np.diff(samples, axis=1))[:-1]
+    column_steps = np.abs(np.diff(samples, axis=0))[:, :-1]
+    if not row_steps.size:
+        return 0.0
+    # Nearest sampling also rounds the sample to a pixel
+    return float(((row_steps + column_steps) / 2).max()) + 0.5
+
+
+class BirdsEyeWarpCache:
+    """
+    Reuses the bird's-eye warp of previous frames of the same arena.
+    The boundary markers barely move between shots, so frames are keyed by their corners quantized to
+    `quantization` pixels. Every key keeps fixed-point remap tables of the inverse transform, which makes
+    cv2.remap skip the per pixel projective math of cv2.warpPerspective.
+    Building the tables costs about as much as a warp, so the cache only pays off when the same arena is warped
+    several times (see benchmarks/birds_eye_warp.py), a single frame is faster with cv2.warpPerspective.
+    """
+
+    def __init__(self, quantization=BIRDS_EYE_CORNER_QUANTIZATION, max_entries=8):
+        self.quantization = quantization
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def _key(self, drone_img, coordinates, scale, interpolation):
+        corners = np.round(np.array(coordinates, dtype="float32") / self.quantization).astype(int)
+        return drone_img.shape[:2], tuple(corners.ravel()), scale, interpolation == cv2.INTER_NEAREST
+
+    @staticmethod
+    def _build_remap_tables(coordinates, scale, interpolation):
+        M, width, height = _birds_eye_transform(coordinates, scale)
+        inverse_M = np.linalg.inv(M).astype(np.float32)
+        # Every plane of the projection is a row plus a column, broadcasting skips building full coordinate grids
+        x = np.arange(width, dtype=np.float32)
+        y = np.arange(height, dtype=np.float32)[:, None]
+        inverse_projection = np.reciprocal(inverse_M[2, 0] * x + (inverse_M[2, 1] * y + inverse_M[2, 2]))
+        map_x = inverse_M[0, 0] * x + (inverse_M[0, 1] * y + inverse_M[0, 2])
+        map_x *= inverse_projection
+        map_y = inverse_M[1, 0] * x + (inverse_M[1, 1] * y + inverse_M[1, 2])
+        map_y *= inverse_projection
+        # Nearest tables round to the closest pixel as cv2.warpPerspective does, the interpolation tables keep the
+        # fractions that nearest sampling would truncate instead
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2, nninterpolation=interpolation == cv2.INTER_NEAREST)
+
+    def warp(self, drone_img, coordinates, scale=1.0, interpolation=cv2.INTER_LINEAR):
+        key = self._key(drone_img, coordinates, scale, interpolation)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            self._entries[key] = self._build_remap_tables(coordinates, scale, interpolation)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        fixed_point_map, interpolation_map = self._entries[key]
+        return cv2.remap(drone_img, fixed_point_map, interpolation_map, interpolation)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def apply_birds_eye(drone_img: np.array, coordinates, warp_cache: BirdsEyeWarpCache = None, scale=1.0,
+                    interpolation=cv2.INTER_LINEAR):
+    """
+    Warps the drone image into a bird's-eye view of the area inside the ordered boundary coordinates.
+    A scale below 1 warps straight into a smaller view instead of resizing the full resolution one.
+    """
+    if warp_cache is not None:
+        return warp_cache.warp(drone_img, coordinates, scale=scale, interpolation=interpolation)
+    M, width, height = _birds_eye_transform(coordinates, scale)
     # Apply the perspective transformation
-    wrapped = cv2.warpPerspective(drone_img, M, (max_width, max_height))
-    # If needed, crop the image to exclude boundary regions (adjust margin as needed)
-    if BIRDS_EYE_MARGIN:
-        wrapped = wrapped[BIRDS_EYE_MARGIN:max_height - BIRDS_EYE_MARGIN, BIRDS_EYE_MARGIN:max_width - BIRDS_EYE_MARGIN]
-    return wrapped
+    return cv2.warpPerspective(drone_img, M, (width, height), flags=interpolation)
+
+
+def apply_min_pooled_birds_eye(drone_img, coordinates, scale):
+    """
+    Warps the drone image into a downscaled bird's-eye view with nearest sampling, where every pixel holds the
+    per channel minimum of the source pixels around its sample, up to a bit more than the sampling radius (see
+    get_birds_eye_sampling_radius). Plain nearest sampling skips the pixels between the samples, the minimum keeps
+    any dark pixel among them: a thin black obstacle stays black, and blue or red stay blue or red when pooled with
+    the light floor. Only the area inside the coordinates is pooled, the pixels outside of it count as white.
+    """
+    M, width, height = _birds_eye_transform(coordinates, scale)
+    sampling_radius = get_birds_eye_sampling_radius(coordinates, scale)
+    # The frame is first min-pooled into blocks by a single small erosion, and the large radius is then eroded on
+    # the blocks, as eroding it at full resolution costs more than the whole full resolution pipeline
+    block_size = max(1, min(MIN_POOL_BLOCK_SIZE, int(sampling_radius) // 4))
+    # A source pixel and the sample covering it may sit in blocks on both sides of their own distance
+    radius = int(np.ceil(sampling_radius / block_size)) + 1
+    corners = np.array(coordinates, dtype="float32")
+    margin = (radius + 1) * block_size
+    left, top = np.maximum(np.floor(corners.min(axis=0)).astype(int) - margin, 0)
+    right, bottom = np.ceil(corners.max(axis=0)).astype(int) + margin + 1
+    area = np.zeros((min(bottom, drone_img.shape[0]) - top, min(right, drone_img.shape[1]) - left), dtype=np.uint8)
+    cv2.fillConvexPoly(area, np.round(corners - (left, top)).astype(np.int32), 1)
+    area_img = np.full(area.shape + drone_img.shape[2:], 255, dtype=drone_img.dtype)
+    cv2.copyTo(drone_img[top:bottom, left:right], area, area_img)
+    blocks = cv2.erode(area_img, np.ones((block_size, block_size), np.uint8), anchor=(0, 0))[::block_size, ::block_size]
+    blocks = cv2.erode(blocks, np.ones((2 * radius + 1, 2 * radius + 1), np.uint8))
+    # Sample the blocks where the full frame would be sampled, a block stands at the center of its pixels
+    block_offset = (block_size - 1) / 2
+    M = M @ np.array([[block_size, 0, left + block_offset], [0, block_size, top + block_offset], [0, 0, 1]])
+    return cv2.warpPerspective(blocks, M, (width, height), flags=cv2.INTER_NEAREST)
 
 
 def plot_birds_eye_view(birds_eye_img):
+    if not plots_enabled():
+        return
     image_rgb = cv2.cvtColor(birds_eye_img, cv2.COLOR_BGR2RGB)
     plot_image(image_rgb, "Bird's-Eye View")
 
 
 def plot_path_on_birds_eye_image(birds_eye_img, direction_array, step_size):
+    if not plots_enabled():
+        return
     image_rgb = cv2.cvtColor(birds_eye_img, cv2.COLOR_BGR2RGB)
     x, y = (0, 0)
     path_coordinates = [((y + 1) * step_size, (x + 1) * step_size)]
@@ -57,3 +195,19 @@ def plot_path_on_birds_eye_image(birds_eye_img, direction_array, step_size):
         bottom_right = (top_left[0] + step_size, top_left[1] + step_size)
         cv2.rectangle(image_rgb, top_left, bottom_right, color=(0, 255, 0), thickness=-1)
     plot_image(image_rgb, "Path Visualization")
+
+
+def plot_segments_on_birds_eye_image(birds_eye_img, segments, step_size, start=(0, 0)):
+    """
+    Draws the (rows, cols) segments of a smoothed path as lines between the centers of their cells.
+    """
+    if not plots_enabled():
+        return
+    image_rgb = cv2.cvtColor(birds_eye_img, cv2.COLOR_BGR2RGB)
+    row, col = start
+    for d_row, d_col in segments:
+        segment_start = (col * step_size + step_size // 2, row * step_size + step_size // 2)
+        row, col = row + d_row, col + d_col
+        segment_end = (col * step_size + step_size // 2, row * step_size + step_size // 2)
+        cv2.line(image_rgb, segment_start, segment_end, color=(0, 255, 0), thickness=max(step_size // 4, 1))
+    plot_image(image_rgb, "Path Visualization")
@@ -0,0 +1,112 @@
+import os
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from config.constants import OBSTACLES_LOWER_BOUND1, OBSTACLES_UPPER_BOUND1, OBSTACLES_LOWER_BOUND2, \
+    OBSTACLES_UPPER_BOUND2, DESTINATION_LOWER_BOUND1, DESTINATION_UPPER_BOUND1, DESTINATION_LOWER_BOUND2, \
+    DESTINATION_UPPER_BOUND2, OBSTACLE_LABEL, DESTINATION_LABEL, COLOR_MODEL_CACHE_PATH
+
+# Labeled HSV color ranges, a pixel inside several ranges gets the highest label.
+# Boundaries are labeled as background so they are not listed.
+DEFAULT_COLOR_RANGES = (
+    (OBSTACLE_LABEL, OBSTACLES_LOWER_BOUND1, OBSTACLES_UPPER_BOUND1),
+    (OBSTACLE_LABEL, OBSTACLES_LOWER_BOUND2, OBSTACLES_UPPER_BOUND2),
+    (DESTINATION_LABEL, DESTINATION_LOWER_BOUND1, DESTINATION_UPPER_BOUND1),
+    (DESTINATION_LABEL, DESTINATION_LOWER_BOUND2, DESTINATION_UPPER_BOUND2),
+)
+
+MAX_COLOR_RANGES = 8
+
+
+def _color_ranges_to_array(color_ranges):
+    """
+    Flattens the color ranges into an (N, 7) array of label, lower bound and upper bound, used as the cache key.
+    """
+    return np.array([[label, *lower_bound, *upper_bound] for label, lower_bound, upper_bound in color_ranges],
+                    dtype=np.int32).reshape(-1, 7)
+
+
+class ColorModel:
+    """
+    Labels HSV images by color ranges using compiled lookup tables.
+
+    Every color range is a box in HSV space, so a pixel is inside a range only if each of its channels is.
+    Instead of a dense 180x256x256 table, each range gets one bit in three per channel tables: ANDing the lookups
+    of a pixel leaves the bits of the ranges containing it, and a last table maps those bits to the label.
+    """
+
+    def __init__(self, color_ranges, channel_luts, labels_lut):
+        self.color_ranges = _color_ranges_to_array(color_ranges)
+        self.channel_luts = channel_luts
+        self.labels_lut = labels_lut
+
+    @classmethod
+    def compile(cls, color_ranges):
+        if len(color_ranges) > MAX_COLOR_RANGES:
+            raise ValueError(f"A color model supports up to {MAX_COLOR_RANGES} color ranges")
+        channel_luts = np.zeros((3, 256), dtype=np.uint8)
+        labels_lut = np.zeros(256, dtype=np.uint8)
+        for bit, (label, lower_bound, upper_bound) in enumerate(color_ranges):
+            for channel in range(3):
+                channel_luts[channel, lower_bound[channel]:upper_bound[channel] + 1] |= 1 << bit
+            range_bits = np.arange(256) & (1 << bit) > 0
+            labels_lut[range_bits] = np.maximum(labels_lut[range_bits], label)
+        return cls(color_ranges, channel_luts, labels_lut)
+
+    def save(self, path):
+        np.savez(path, color_ranges=self.color_ranges, channel_luts=self.channel_luts, labels_lut=self.labels_lut)
+
+    @classmethod
+    def load(cls, path, color_ranges):
+        """
+        Loads a model saved by save, returns None if it was compiled from other color ranges.
+        """
+        with np.load(path) as saved_model:
+            if not np.array_equal(saved_model["color_ranges"], _color_ranges_to_array(color_ranges)):
+                return None
+            return cls(color_ranges, saved_model["channel_luts"], saved_model["labels_lut"])
+
+    def classify(self, hsv_image, out=None):
+        """
+        Labels every pixel of an HSV image in a single lookup pass.
+
+        Parameters:
+        - hsv_image: Input image in HSV format.
+        - out: Optional uint8 array of the image height and width to write the labels into, reused between frames.
+
+        Returns:
+        np.ndarray: uint8 matrix of labels.
+        """
+        if out is not None and (out.shape != hsv_image.shape[:2] or out.dtype != np.uint8):
+            raise ValueError("The output array must be a uint8 array of the image height and width")
+        hue, saturation, value = cv2.split(hsv_image)
+        range_bits = cv2.LUT(hue, self.channel_luts[0], dst=hue)
+        range_bits = cv2.bitwise_and(range_bits, cv2.LUT(saturation, self.channel_luts[1], dst=saturation),
+                                     dst=range_bits)
+        range_bits = cv2.bitwise_and(range_bits, cv2.LUT(value, self.channel_luts[2], dst=value), dst=range_bits)
+        return cv2.LUT(range_bits, self.labels_lut, dst=out)
+
+
+@lru_cache(maxsize=None)
+def get_default_color_model(cache_path=COLOR_MODEL_CACHE_PATH):
+    """
+    Returns the color model of the ranges in config.constants.
+    It is compiled once per process and persisted to cache_path, so later runs load it as long as the constants
+    did not change.
+    """
+    if cache_path and os.path.exists(cache_path):
+        try:
+            color_model = ColorModel.load(cache_path, DEFAULT_COLOR_RANGES)
+        except (OSError, ValueError, KeyError):
+            color_model = None
+        if color_model is not None:
+            return color_model
+    color_model = ColorModel.compile(DEFAULT_COLOR_RANGES)
+    if cache_path:
+        try:
+            color_model.save(cache_path)
+        except OSError:
+            print(f"Could not save the color model to {cache_path}")
+    return color_model
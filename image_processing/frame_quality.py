@@ -0,0 +1,63 @@
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from config.constants import BOUNDARIES_LOWER_BOUND1, BOUNDARIES_UPPER_BOUND1, BOUNDARIES_LOWER_BOUND2, \
+    BOUNDARIES_UPPER_BOUND2, FRAME_MIN_SHARPNESS, FRAME_MAX_CORNER_SHIFT
+from image_processing.preprocess import find_boundaries, order_boundaries
+
+BOUNDARY_MARKERS_COUNT = 4
+
+
+class FrameQuality(NamedTuple):
+    accepted: bool
+    reason: str
+    boundaries: np.ndarray = None
+    sharpness: float = 0.0
+    corner_shift: float = None
+
+
+def measure_sharpness(image):
+    """
+    Variance of the Laplacian of the grayscale image, low values mean a blurry frame.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+class FrameQualityGate:
+    """
+    Accepts the first frame of a stable hover: all four boundary markers are detected, the frame is sharp and the
+    markers moved less than max_corner_shift pixels since the previous frame checked.
+    """
+
+    def __init__(self, min_sharpness=FRAME_MIN_SHARPNESS, max_corner_shift=FRAME_MAX_CORNER_SHIFT):
+        self.min_sharpness = min_sharpness
+        self.max_corner_shift = max_corner_shift
+        self._previous_boundaries = None
+
+    def reset(self):
+        self._previous_boundaries = None
+
+    def check(self, frame) -> FrameQuality:
+        """
+        :param frame: BGR image, or RGBA as captured by DroneController.
+        """
+        image = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR) if frame.shape[2] == 4 else frame
+        boundaries = find_boundaries(image, BOUNDARIES_LOWER_BOUND1, BOUNDARIES_UPPER_BOUND1, BOUNDARIES_LOWER_BOUND2,
+                                     BOUNDARIES_UPPER_BOUND2)
+        if len(boundaries) != BOUNDARY_MARKERS_COUNT:
+            self._previous_boundaries = None
+            return FrameQuality(False, f"{len(boundaries)} boundary markers detected")
+        ordered_boundaries = order_boundaries(boundaries)
+        previous_boundaries, self._previous_boundaries = self._previous_boundaries, ordered_boundaries
+        sharpness = measure_sharpness(image)
+        if sharpness < self.min_sharpness:
+            return FrameQuality(False, "blurry frame", ordered_boundaries, sharpness)
+        if previous_boundaries is None:
+            return FrameQuality(False, "no previous frame to measure motion", ordered_boundaries, sharpness)
+        corner_shift = float(np.linalg.norm(ordered_boundaries - previous_boundaries, axis=1).max())
+        if corner_shift > self.max_corner_shift:
+            return FrameQuality(False, "drone still moving", ordered_boundaries, sharpness, corner_shift)
+        return FrameQuality(True, "stable", ordered_boundaries, sharpness, corner_shift)
@@ -1,7 +1,65 @@
-from matplotlib import pyplot as plt
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from config.constants import PLOT_MODE, PLOTS_OUTPUT_DIR
+
+# "show" blocks on a matplotlib window per plot, "save" writes the plots to PNG files from a background thread and
+# "off" skips them. matplotlib is only imported once a plot is shown.
+PLOT_MODES = ("show", "save", "off")
+
+_plot_settings = {"mode": PLOT_MODE, "output_dir": PLOTS_OUTPUT_DIR, "count": 0}
+_plot_writer = None
+
+
+def set_plot_mode(mode, output_dir=PLOTS_OUTPUT_DIR):
+    if mode not in PLOT_MODES:
+        raise ValueError(f"Unknown plot mode '{mode}', expected one of {PLOT_MODES}")
+    _plot_settings["mode"] = mode
+    _plot_settings["output_dir"] = output_dir
+
+
+def plots_enabled():
+    return _plot_settings["mode"] != "off"
+
+
+def _save_image(image, path):
+    # Plotted images are RGB while OpenCV writes BGR
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    cv2.imwrite(path, image)
+
+
+def _save_plot(image, title):
+    global _plot_writer
+    if _plot_writer is None:
+        _plot_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plot_writer")
+    output_dir = _plot_settings["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+    _plot_settings["count"] += 1
+    file_name = f"{_plot_settings['count']:03d}_{re.sub(r'[^a-z0-9]+', '_', title.lower()).strip('_')}.png"
+    return _plot_writer.submit(_save_image, image, os.path.join(output_dir, file_name))
+
+
+def wait_for_saved_plots():
+    """
+    Blocks until all the plots queued in "save" mode are written.
+    """
+    global _plot_writer
+    if _plot_writer is not None:
+        _plot_writer.shutdown(wait=True)
+        _plot_writer = None
 
 
 def plot_image(image, title):
+    if _plot_settings["mode"] == "off":
+        return
+    if _plot_settings["mode"] == "save":
+        _save_plot(image, title)
+        return
+    from matplotlib import pyplot as plt
     plt.figure(figsize=(10, 10))
     plt.imshow(image)
     plt.title(title)
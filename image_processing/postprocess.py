@@ -1,7 +1,7 @@
 import cv2
 import numpy as np
 
-from image_processing.plot_utils import plot_image
+from image_processing.plot_utils import plot_image, plots_enabled
 
 
 def plot_heatmap_over_image(image, heatmap_matrix, alpha=1):
@@ -13,6 +13,8 @@ def plot_heatmap_over_image(image, heatmap_matrix, alpha=1):
     - heatmap_matrix: 2D numpy array, matrix of 0/1/2 values representing the heat map.
     - alpha: float, transparency factor for the overlay (default is 0.5).
     """
+    if not plots_enabled():
+        return
     # Create a color map for the heat map matrix
     colormap = np.zeros((heatmap_matrix.shape[0], heatmap_matrix.shape[1], 3), dtype=np.uint8)
     colormap[heatmap_matrix == 0] = [0, 0, 255]  # Blue for 0
@@ -2,11 +2,9 @@ from typing import List, Tuple
 import numpy as np
 import cv2
 
-from config.constants import BOUNDARIES_LOWER_BOUND1, BOUNDARIES_UPPER_BOUND1, BOUNDARIES_LOWER_BOUND2, \
-    BOUNDARIES_UPPER_BOUND2, OBSTACLES_UPPER_BOUND1, OBSTACLES_LOWER_BOUND1, DESTINATION_LOWER_BOUND1, \
-    DESTINATION_UPPER_BOUND1, OBSTACLES_LOWER_BOUND2, OBSTACLES_UPPER_BOUND2, DESTINATION_UPPER_BOUND2, \
-    DESTINATION_LOWER_BOUND2, MIN_CONTOUR_AREA
-from image_processing.plot_utils import plot_image
+from config.constants import MIN_CONTOUR_AREA
+from image_processing.color_model import get_default_color_model
+from image_processing.plot_utils import plot_image, plots_enabled
 
 
 def _get_mask_by_two_hsv_color_ranges(image, lower_bound_1, upper_bound_1, lower_bound_2, upper_bound_2):
@@ -76,6 +74,8 @@ def order_boundaries(coordinates):
 
 
 def plot_img_with_boundaries(image, coordinates):
+    if not plots_enabled():
+        return
     # TODO - check if the conversion line is required or not at uni
     # Convert the image from BGR to RGB for displaying with matplotlib
     # image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
@@ -87,39 +87,24 @@ def plot_img_with_boundaries(image, coordinates):
     plot_image(image_with_points, "Input image with detected boundaries")
 
 
-def convert_birds_eye_image_to_matrix(image):
+def classify_hsv_image(hsv_image, out=None):
+    """
+    Labels every pixel of an HSV image with the color model compiled from config.constants.
+    See ColorModel.classify.
+    """
+    return get_default_color_model().classify(hsv_image, out=out)
+
+
+def convert_birds_eye_image_to_matrix(image, out=None):
     """
     Processes the image to create a matrix with values 0, 1, and 2
     where 0 corresponds to the background, 1 to obstacles and 2 to destination.
+    Parameters:
+    - image: Input image in BGR format.
+    - out: Optional uint8 array to write the matrix into, see classify_hsv_image.
     Returns:
-    np.ndarray: Matrix with values 0, 1, and 2.
+    np.ndarray: uint8 matrix with values 0, 1, and 2.
     """
-    # # Convert the image to RGB and then to HSV which suits best for color ranges (OpenCV loads images in BGR format)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-    # Get Color masks
-    obstacles_mask = _get_mask_by_two_hsv_color_ranges(hsv_image,
-                                                       lower_bound_1=OBSTACLES_LOWER_BOUND1,
-                                                       upper_bound_1=OBSTACLES_UPPER_BOUND1,
-                                                       lower_bound_2=OBSTACLES_LOWER_BOUND2,
-                                                       upper_bound_2=OBSTACLES_UPPER_BOUND2
-                                                       )
-    destination_mask = _get_mask_by_two_hsv_color_ranges(hsv_image,
-                                                         lower_bound_1=DESTINATION_LOWER_BOUND1,
-                                                         upper_bound_1=DESTINATION_UPPER_BOUND1,
-                                                         lower_bound_2=DESTINATION_LOWER_BOUND2,
-                                                         upper_bound_2=DESTINATION_UPPER_BOUND2
-                                                         )
-    boundaries_mask = _get_mask_by_two_hsv_color_ranges(hsv_image,
-                                                        lower_bound_1=BOUNDARIES_LOWER_BOUND1,
-                                                        upper_bound_1=BOUNDARIES_UPPER_BOUND1,
-                                                        lower_bound_2=BOUNDARIES_LOWER_BOUND2,
-                                                        upper_bound_2=BOUNDARIES_UPPER_BOUND2
-                                                        )
-    # Initialize the matrix with zeros (for background)
-    birds_eye_matrix = np.zeros(image.shape[:2], dtype=int)
-    # Set matrix values based on masks
-    birds_eye_matrix[boundaries_mask > 0] = 0
-    birds_eye_matrix[obstacles_mask > 0] = 1
-    birds_eye_matrix[destination_mask > 0] = 2
-    return birds_eye_matrix
+    # HSV suits best for color ranges (OpenCV loads images in BGR format)
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    return classify_hsv_image(hsv_image, out=out)
@@ -1,15 +1,40 @@
-from config.constants import XY_SPEED, STEP_SIZE_X, STEP_SIZE_Y
+import math
+import threading
+from concurrent.futures import Future
+
+from config.constants import XY_SPEED, STEP_SIZE_X, STEP_SIZE_Y, DRIFT_TOLERANCE
+from jeep.pose_tracker import PoseTracker
+from jeep.trajectory import segments_to_waypoints, plan_trajectory, follow_trajectory
+from path_planner.path_smoothing import DIRECTION_STEPS
 from robomaster import robot
 
 
 class JeepController:
-    OPPOSITE_DIRECTION = {'Up': 'Down', 'Down': 'Up', 'Right': 'Left', 'Left': 'Right'}
-
     def __init__(self):
         self.ep_robot = robot.Robot()
-        self.ep_robot.initialize(conn_type='sta', proto_type='tcp')
+        if self.ep_robot.initialize(conn_type='sta', proto_type='tcp') is False:
+            raise ConnectionError("Could not connect to the jeep")
         self.chassis = self.ep_robot.chassis
 
+    @classmethod
+    def connect_in_background(cls) -> Future:
+        """
+        Connecting takes seconds (connection negotiation, module scan, SDK mode, reset and FTP), so it can be started
+        early and run in a background thread while other work goes on.
+        :return: Future whose result is the connected JeepController, or raises the connection error.
+        """
+        connection = Future()
+        connection.set_running_or_notify_cancel()
+
+        def connect():
+            try:
+                connection.set_result(cls())
+            except Exception as e:
+                connection.set_exception(e)
+
+        threading.Thread(target=connect, name="jeep_connect", daemon=True).start()
+        return connection
+
     def move_chassis(self, direction, step_size=None):
         """
         Moves jeep in the given direction (Up, Down, Right, Left) with the given step size.
@@ -30,17 +55,71 @@ class JeepController:
             self.chassis.move(x=0, y=step_size_y, z=0, xy_speed=XY_SPEED).wait_for_completed()
         self.chassis.stop()
 
-    def _correct_last_move_drift(self, last_move_direction):
-        self.move_chassis(direction=self.OPPOSITE_DIRECTION.get(last_move_direction),
-                          step_size=0.1)
-
-    def move_jeep_by_directions(self, directions, start_move_x=0, start_move_y=0):
-        if start_move_x or start_move_y:
-            self.chassis.move(x=start_move_x, y=start_move_y, z=0, xy_speed=XY_SPEED).wait_for_completed()
+    def _stop_and_close(self):
+        """
+        Stops the jeep and closes the connection, also when driving failed half way (e.g. no position feedback).
+        """
+        try:
+            self.chassis.drive_speed(0, 0, 0)
             self.chassis.stop()
-        last_move = None
-        for direction in directions:
-            last_move = direction
-            self.move_chassis(direction)
-        self._correct_last_move_drift(last_move)
-        self.ep_robot.close()
+        finally:
+            self.ep_robot.close()
+
+    def _move_by(self, x, y):
+        self.chassis.move(x=x, y=y, z=0, xy_speed=XY_SPEED).wait_for_completed()
+        self.chassis.stop()
+
+    def _correct_drift(self, pose_tracker, target):
+        """
+        Moves the jeep onto target (x, y in the frame tracking started in) with a single move, only if it drifted
+        further than DRIFT_TOLERANCE from it.
+        """
+        x, y, _ = pose_tracker.next_pose()
+        error_x, error_y = target[0] - x, target[1] - y
+        if math.hypot(error_x, error_y) <= DRIFT_TOLERANCE:
+            return
+        print(f"Correcting a drift of {math.hypot(error_x, error_y):.3f} m")
+        self._move_by(*pose_tracker.to_body_frame(error_x, error_y))
+
+    def _move_by_waypoints(self, waypoints, correct_between_moves=False):
+        """
+        Moves from waypoint to waypoint (see jeep.trajectory.segments_to_waypoints), one move each, while tracking
+        the actual position. Drift is corrected at the end, or after every move with correct_between_moves.
+        """
+        with PoseTracker(self.chassis) as pose_tracker:
+            pose_tracker.wait_for_pose()
+            for move_index, (previous_waypoint, waypoint) in enumerate(zip(waypoints, waypoints[1:]), start=1):
+                self._move_by(*pose_tracker.to_body_frame(*(waypoint - previous_waypoint)))
+                if correct_between_moves or move_index == len(waypoints) - 1:
+                    self._correct_drift(pose_tracker, waypoint)
+
+    def move_jeep_by_directions(self, directions, start_move_x=0, start_move_y=0, correct_between_moves=False):
+        cell_moves = [DIRECTION_STEPS[direction] for direction in directions]
+        try:
+            self._move_by_waypoints(segments_to_waypoints(cell_moves, start_move_x, start_move_y),
+                                    correct_between_moves)
+        finally:
+            self._stop_and_close()
+
+    def move_jeep_by_segments(self, segments, start_move_x=0, start_move_y=0, correct_between_moves=False):
+        """
+        Same as move_jeep_by_directions for a smoothed path, see path_planner.path_smoothing.
+        :param segments: list of (rows, cols) segments.
+        """
+        try:
+            self._move_by_waypoints(segments_to_waypoints(segments, start_move_x, start_move_y), correct_between_moves)
+        finally:
+            self._stop_and_close()
+
+    def follow_segments(self, segments, start_move_x=0, start_move_y=0):
+        """
+        Drives the initial move and the (rows, cols) segments as one continuous trajectory with drive_speed, without
+        stopping between moves, see jeep.trajectory.
+        """
+        trajectory = plan_trajectory(segments_to_waypoints(segments, start_move_x, start_move_y))
+        try:
+            with PoseTracker(self.chassis) as pose_tracker:
+                remaining_distance = follow_trajectory(self.chassis, pose_tracker, trajectory)
+        finally:
+            self._stop_and_close()
+        print(f"Trajectory finished {remaining_distance:.3f} m from the destination")
@@ -0,0 +1,102 @@
+import math
+import threading
+from time import monotonic
+
+from config.constants import TRAJECTORY_CONTROL_RATE
+
+
+class PoseTracker:
+    """
+    Keeps the latest chassis pose pushed by the position and attitude subscriptions, relative to where tracking
+    started. x is forward and y is right (in meters) as in Chassis.move, yaw is in degrees and comes from the
+    attitude once it arrives, the yaw of the position is used until then.
+    """
+
+    def __init__(self, chassis, freq=TRAJECTORY_CONTROL_RATE):
+        self.chassis = chassis
+        self.freq = freq
+        self._origin = None
+        self._pose = None
+        self._yaw_origin = None
+        self._yaw = None
+        self._updates = 0
+        self._updated = threading.Condition()
+
+    def _on_position(self, position):
+        x, y, yaw = position
+        with self._updated:
+            if self._origin is None:
+                self._origin = (x, y, yaw)
+            origin_x, origin_y, origin_yaw = self._origin
+            self._pose = (x - origin_x, y - origin_y, yaw - origin_yaw)
+            self._updates += 1
+            self._updated.notify_all()
+
+    def _on_attitude(self, attitude):
+        yaw, _, _ = attitude
+        with self._updated:
+            if self._yaw_origin is None:
+                self._yaw_origin = yaw
+            self._yaw = yaw - self._yaw_origin
+
+    def start(self):
+        with self._updated:
+            self._origin = None
+            self._pose = None
+            self._yaw_origin = None
+            self._yaw = None
+            self._updates = 0
+        self.chassis.sub_position(cs=0, freq=self.freq, callback=self._on_position)
+        self.chassis.sub_attitude(freq=self.freq, callback=self._on_attitude)
+
+    def stop(self):
+        self.chassis.unsub_position()
+        self.chassis.unsub_attitude()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def pose(self):
+        """
+        :return: (x, y, yaw) since tracking started, or None before the first position arrived.
+        """
+        with self._updated:
+            if self._pose is None or self._yaw is None:
+                return self._pose
+            x, y, _ = self._pose
+            return x, y, self._yaw
+
+    def _wait_for_updates(self, updates, timeout):
+        deadline = monotonic() + timeout
+        with self._updated:
+            while self._pose is None or self._updates < updates:
+                remaining_time = deadline - monotonic()
+                if remaining_time <= 0:
+                    raise TimeoutError("No position feedback from the jeep")
+                self._updated.wait(remaining_time)
+
+    def wait_for_pose(self, timeout=1.0):
+        self._wait_for_updates(1, timeout)
+        return self.pose()
+
+    def next_pose(self, timeout=1.0):
+        """
+        Waits for a position pushed after the call, e.g. to measure where a move really ended.
+        """
+        with self._updated:
+            updates = self._updates + 1
+        self._wait_for_updates(updates, timeout)
+        return self.pose()
+
+    def to_body_frame(self, x, y):
+        """
+        Rotates a vector from the frame tracking started in to the current heading of the jeep, as drive_speed and
+        move expect it.
+        """
+        _, _, yaw = self.pose()
+        yaw = math.radians(yaw)
+        return float(math.cos(yaw) * x + math.sin(yaw) * y), float(-math.sin(yaw) * x + math.cos(yaw) * y)
@@ -0,0 +1,122 @@
+from time import monotonic, sleep
+from typing import NamedTuple
+
+import numpy as np
+
+from config.constants import XY_SPEED, STEP_SIZE_X, STEP_SIZE_Y, JEEP_MAX_ACCELERATION, TRAJECTORY_CONTROL_RATE, \
+    TRAJECTORY_POSITION_GAIN, TRAJECTORY_GOAL_TOLERANCE
+
+
+class Trajectory(NamedTuple):
+    """
+    Reference of the jeep sampled at the control rate: times (s), positions (m) and velocities (m/s), with x forward
+    and y right as in Chassis.move.
+    """
+    times: np.ndarray
+    positions: np.ndarray
+    velocities: np.ndarray
+
+
+def segments_to_waypoints(segments, start_move_x=0, start_move_y=0):
+    """
+    Converts (rows, cols) map segments into waypoints in meters, starting at the jeep and going through the
+    initial move into the navigation area.
+    """
+    waypoints = [(0.0, 0.0)]
+    if start_move_x or start_move_y:
+        waypoints.append((start_move_x, start_move_y))
+    for rows, cols in segments:
+        x, y = waypoints[-1]
+        waypoints.append((x - rows * STEP_SIZE_X, y + cols * STEP_SIZE_Y))
+    return np.array(waypoints, dtype=float)
+
+
+def _waypoint_speeds(directions, lengths, max_speed, max_acceleration):
+    """
+    Speed the jeep may have at every waypoint: it stops at both ends, keeps full speed when going straight on, a quarter
+    of it through a right angle and stops before reversing. The speeds are then lowered so that each can be reached
+    from its neighbors within max_acceleration.
+    """
+    speeds = np.zeros(len(lengths) + 1)
+    speeds[1:-1] = max_speed * ((1 + np.sum(directions[:-1] * directions[1:], axis=1)) / 2) ** 2
+    for i in range(len(lengths)):
+        speeds[i + 1] = min(speeds[i + 1], np.sqrt(speeds[i] ** 2 + 2 * max_acceleration * lengths[i]))
+    for i in reversed(range(len(lengths))):
+        speeds[i] = min(speeds[i], np.sqrt(speeds[i + 1] ** 2 + 2 * max_acceleration * lengths[i]))
+    return speeds
+
+
+def plan_trajectory(waypoints, max_speed=XY_SPEED, max_acceleration=JEEP_MAX_ACCELERATION,
+                    rate=TRAJECTORY_CONTROL_RATE) -> Trajectory:
+    """
+    Time-parameterizes the polyline through the waypoints with a trapezoidal speed profile: the jeep accelerates up
+    to max_speed, slows down ahead of the turns as needed (see _waypoint_speeds) and stops at the last waypoint.
+    """
+    deltas = np.diff(waypoints, axis=0)
+    lengths = np.linalg.norm(deltas, axis=1)
+    deltas, lengths = deltas[lengths > 0], lengths[lengths > 0]
+    if not len(lengths):
+        return Trajectory(np.zeros(1), np.asarray(waypoints[:1], dtype=float), np.zeros((1, 2)))
+    directions = deltas / lengths[:, None]
+    waypoint_distances = np.concatenate(([0], np.cumsum(lengths)))
+    corners = waypoints[0] + np.concatenate(([[0, 0]], np.cumsum(deltas, axis=0)))
+    waypoint_speeds = _waypoint_speeds(directions, lengths, max_speed, max_acceleration)
+    dt = 1 / rate
+    times, positions, velocities = [0.0], [corners[0]], [np.zeros(2)]
+    distance, speed = 0.0, 0.0
+    while distance < waypoint_distances[-1]:
+        segment = min(np.searchsorted(waypoint_distances, distance, side="right") - 1, len(lengths) - 1)
+        # Fastest speed from which the jeep still slows down to the next waypoint speed in time, never below one
+        # acceleration step so that it does not crawl into the last waypoint forever
+        braking_speed = np.sqrt(waypoint_speeds[segment + 1] ** 2 +
+                                2 * max_acceleration * (waypoint_distances[segment + 1] - distance))
+        next_speed = max(min(speed + max_acceleration * dt, max_speed, braking_speed), max_acceleration * dt)
+        distance = min(distance + (speed + next_speed) / 2 * dt, waypoint_distances[-1])
+        speed = next_speed
+        segment = min(np.searchsorted(waypoint_distances, distance, side="right") - 1, len(lengths) - 1)
+        times.append(times[-1] + dt)
+        positions.append(corners[segment] + directions[segment] * (distance - waypoint_distances[segment]))
+        velocities.append(directions[segment] * speed)
+    velocities[-1] = np.zeros(2)
+    return Trajectory(np.array(times), np.array(positions), np.array(velocities))
+
+
+def _clip_speed(velocity, max_speed):
+    speed = np.linalg.norm(velocity)
+    return velocity if speed <= max_speed else velocity * max_speed / speed
+
+
+def follow_trajectory(chassis, pose_tracker, trajectory, gain=TRAJECTORY_POSITION_GAIN,
+                      tolerance=TRAJECTORY_GOAL_TOLERANCE, max_speed=XY_SPEED, settle_timeout=2.0):
+    """
+    Streams the trajectory to Chassis.drive_speed at its sampling rate. Every command is the reference velocity plus
+    gain times the error from the reference position, so the jeep drives the whole path without stopping while
+    position feedback keeps it on track. Once the trajectory ends, the jeep closes in on the last waypoint until it
+    is within tolerance or settle_timeout passes.
+
+    :param pose_tracker: a started PoseTracker of the chassis.
+    :return: the remaining distance (m) from the last waypoint.
+    """
+    dt = trajectory.times[1] - trajectory.times[0] if len(trajectory.times) > 1 else 1 / TRAJECTORY_CONTROL_RATE
+    # The chassis stops on its own if the commands stop coming
+    command_timeout = 5 * dt
+    pose_tracker.wait_for_pose()
+    start = monotonic()
+    for time, position, velocity in zip(*trajectory):
+        sleep(max(start + time - monotonic(), 0))
+        x, y, _ = pose_tracker.pose()
+        command = _clip_speed(velocity + gain * (position - (x, y)), max_speed)
+        chassis.drive_speed(*pose_tracker.to_body_frame(*command), z=0, timeout=command_timeout)
+    goal = trajectory.positions[-1]
+    deadline = monotonic() + settle_timeout
+    while True:
+        x, y, _ = pose_tracker.pose()
+        error = goal - (x, y)
+        if np.linalg.norm(error) < tolerance or monotonic() > deadline:
+            break
+        chassis.drive_speed(*pose_tracker.to_body_frame(*_clip_speed(gain * error, max_speed)), z=0,
+                            timeout=command_timeout)
+        sleep(dt)
+    chassis.drive_speed(0, 0, 0)
+    chassis.stop()
+    return float(np.linalg.norm(error))
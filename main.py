@@ -1,31 +1,104 @@
+import asyncio
 from time import sleep
 
+from drone.async_drone_io import AsyncDroneController
 from drone.drone_io import DroneController
+from config.constants import STABLE_FRAME_TIMEOUT
+from image_processing.plot_utils import set_plot_mode
 from jeep.jeep_io import JeepController
-from path_planner.path_planner import create_navigation_directions
+from mission.mission_runner import MissionRunner, MissionStep
+from path_planner.path_planner import plan_from_frame
+
+DRONE_IP = "172.20.10.5"
+DRONE_PORT = 8080
+# Take off has no completion signal from the drone, so it still gets a fixed time to settle
+TAKEOFF_SETTLE_TIME = 5
 
 
 def drone_main():
-    drone = DroneController("172.20.10.5", 8080)
+    drone = DroneController(DRONE_IP, DRONE_PORT)
     drone.takeOff()
     drone.rotatecamera(90)
     sleep(5)
+    drone.start_frame_grabber()
     drone.moveup(40, 3.5)
-    sleep(5)
-    drone.capture_and_save_rgba_image(save_to_path='drone_image.png')
+    # The frame is handed to the planner in memory, the PNG is only kept for debugging
+    frame = drone.capture_stable_frame(save_to_path='drone_image.png')
+    drone.stop_frame_grabber()
+    print("Image Captured")
     sleep(1)
     drone.moveup(-15, 3.5)
     sleep(2)
     drone.movesideways(4, 6)
     drone.land()
     drone.disable()
+    return frame
+
+
+def create_mission(drone: AsyncDroneController, jeep_connection, start_move_x: float = -1.2):
+    """
+    The drone mission as steps: the path is planned while the drone descends and lands, and the jeep drives once the
+    path is ready, the drone landed and the jeep is connected. The drone lands once the capture is over even if the
+    climb or the capture failed. The jeep connection (see
+    JeepController.connect_in_background) goes on during the whole flight.
+    start_move_x initially moves the jeep into the navigation area.
+    """
+
+    async def take_off(results):
+        await asyncio.gather(drone.takeOff(), drone.rotatecamera(90))
+        await asyncio.sleep(TAKEOFF_SETTLE_TIME)
+
+    async def climb(results):
+        drone.start_frame_polling()
+        await drone.moveup(40, 3.5)
+
+    async def capture(results):
+        try:
+            frame = await drone.capture_stable_frame()
+        finally:
+            await drone.stop_frame_polling()
+        print("Image Captured")
+        return frame
+
+    def plan(results):
+        return plan_from_frame(results["capture"], smoothing="any_angle")
+
+    async def land(results):
+        # Polling is still on when the climb failed and the capture was skipped
+        await drone.stop_frame_polling()
+        await drone.moveup(-15, 3.5)
+        await drone.movesideways(4, 6)
+        await drone.land()
+        await drone.disable()
+
+    async def connect_jeep(results):
+        return await asyncio.wrap_future(jeep_connection)
+
+    def drive_jeep(results):
+        navigation_segments = results["plan"]
+        if navigation_segments is None:
+            raise ValueError("No path to a destination was found")
+        print(navigation_segments)
+        results["connect_jeep"].follow_segments(navigation_segments, start_move_x=start_move_x)
+
+    return [
+        MissionStep("take_off", take_off, timeout=30),
+        MissionStep("climb", climb, ("take_off",), timeout=15),
+        MissionStep("capture", capture, ("climb",), timeout=STABLE_FRAME_TIMEOUT + 5),
+        MissionStep("plan", plan, ("capture",), timeout=60),
+        MissionStep("land", land, ("take_off",), timeout=60, after=("capture",)),
+        MissionStep("connect_jeep", connect_jeep, timeout=60),
+        MissionStep("drive_jeep", drive_jeep, ("plan", "connect_jeep", "land")),
+    ]
+
+
+async def run_mission():
+    # Plots cannot open windows outside the main thread
+    set_plot_mode("save")
+    jeep_connection = JeepController.connect_in_background()
+    async with AsyncDroneController(DRONE_IP, DRONE_PORT) as drone:
+        return await MissionRunner(create_mission(drone, jeep_connection)).run()
 
 
 if __name__ == "__main__":
-    drone_main()
-    navigation_directions = create_navigation_directions('drone_image.png')
-    print(navigation_directions)
-    sleep(2)
-    jeep = JeepController()
-    jeep.move_jeep_by_directions(navigation_directions,
-                                 start_move_x=-1.2)  # Initially moves jeep 1.2 meters to enter the navigation area
+    asyncio.run(run_mission())
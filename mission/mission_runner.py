@@ -0,0 +1,132 @@
+import asyncio
+import inspect
+from time import monotonic
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+
+class MissionStep(NamedTuple):
+    """
+    One step of a mission.
+    The action gets the results of the steps finished so far (by step name) and may be a coroutine function or a
+    blocking function, which then runs in a worker thread. A step starts as soon as all the steps it depends on
+    finished, so steps that do not depend on each other overlap.
+    The steps in after only have to end before the step starts, it runs even if they failed (e.g. landing once the
+    capture is over, whether it succeeded or not).
+    """
+    name: str
+    action: Callable[[Dict[str, Any]], Any]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    after: Tuple[str, ...] = ()
+
+
+class StepTiming(NamedTuple):
+    status: str
+    start: float = None
+    end: float = None
+
+    @property
+    def duration(self):
+        return None if self.start is None else self.end - self.start
+
+
+class DependencyFailed(Exception):
+    pass
+
+
+def _check_steps(steps: Sequence[MissionStep]) -> None:
+    names = [step.name for step in steps]
+    if len(set(names)) != len(names):
+        raise ValueError("Mission step names must be unique")
+    for step in steps:
+        unknown_steps = set(step.depends_on + step.after) - set(names)
+        if unknown_steps:
+            raise ValueError(f"Step '{step.name}' depends on unknown steps {sorted(unknown_steps)}")
+    # Steps are awaited along their dependencies, so a cycle would wait forever
+    ordered_steps = set()
+    remaining_steps = list(steps)
+    while remaining_steps:
+        ready_steps = [step for step in remaining_steps
+                       if ordered_steps.issuperset(step.depends_on + step.after)]
+        if not ready_steps:
+            raise ValueError(f"Circular dependencies between steps {[step.name for step in remaining_steps]}")
+        ordered_steps.update(step.name for step in ready_steps)
+        remaining_steps = [step for step in remaining_steps if step.name not in ordered_steps]
+
+
+class MissionRunner:
+    """
+    Runs the steps of a mission on asyncio, each once its dependencies finished and within its timeout.
+    A failed or timed out step skips the steps depending on it while the independent steps go on (e.g. the drone
+    still lands when planning or capturing fails). The per step timings are printed once all steps are done.
+    """
+
+    def __init__(self, steps: Sequence[MissionStep]) -> None:
+        _check_steps(steps)
+        self.steps = list(steps)
+        self.results = {}
+        self.timings = {}
+        self._tasks = {}
+        self._mission_start = None
+
+    async def _call(self, step: MissionStep):
+        if inspect.iscoroutinefunction(step.action):
+            return await step.action(self.results)
+        return await asyncio.to_thread(step.action, self.results)
+
+    async def _run_step(self, step: MissionStep):
+        for dependency in step.depends_on:
+            try:
+                await self._tasks[dependency]
+            except Exception:
+                self.timings[step.name] = StepTiming("skipped")
+                raise DependencyFailed(f"Step '{step.name}' skipped, step '{dependency}' did not finish")
+        if step.after:
+            await asyncio.wait([self._tasks[name] for name in step.after])
+        start = monotonic() - self._mission_start
+        # Not wait_for: a TimeoutError raised by the action itself would look the same as the step timing out
+        action = asyncio.ensure_future(self._call(step))
+        try:
+            finished, _ = await asyncio.wait([action], timeout=step.timeout)
+        finally:
+            action.cancel()
+        if not finished:
+            # Let the cancelled action unwind before the steps after it start
+            await asyncio.wait([action])
+            self.timings[step.name] = StepTiming("timed out", start, monotonic() - self._mission_start)
+            raise asyncio.TimeoutError(f"Step '{step.name}' timed out after {step.timeout} s")
+        try:
+            result = action.result()
+        except Exception:
+            self.timings[step.name] = StepTiming("failed", start, monotonic() - self._mission_start)
+            raise
+        self.timings[step.name] = StepTiming("done", start, monotonic() - self._mission_start)
+        self.results[step.name] = result
+        return result
+
+    def print_timings(self) -> None:
+        print(f"{'step':<20}{'status':<12}{'start':>8}{'end':>8}{'duration':>10}")
+        for step in self.steps:
+            timing = self.timings[step.name]
+            if timing.start is None:
+                print(f"{step.name:<20}{timing.status:<12}")
+            else:
+                print(f"{step.name:<20}{timing.status:<12}{timing.start:>8.2f}{timing.end:>8.2f}"
+                      f"{timing.duration:>10.2f}")
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Runs the mission and returns the results by step name.
+        Raises the error of the first failed step, after the steps not depending on it finished.
+        """
+        self.results = {}
+        self.timings = {}
+        self._mission_start = monotonic()
+        self._tasks = {step.name: asyncio.create_task(self._run_step(step), name=step.name) for step in self.steps}
+        outcomes = await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self.print_timings()
+        errors = [outcome for outcome in outcomes
+                  if isinstance(outcome, BaseException) and not isinstance(outcome, DependencyFailed)]
+        if errors:
+            raise errors[0]
+        return self.results
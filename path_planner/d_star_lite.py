@@ -0,0 +1,172 @@
+import heapq
+from math import inf
+
+import numpy as np
+
+from config.constants import OBSTACLE_LABEL
+from path_planner.grid_map import grid_neighbors
+
+
+class DStarLite:
+    """
+    D* Lite on a 4-connected compressed map, for replanning while the jeep drives.
+
+    The search runs backwards from the goal, so the distances to the goal it keeps stay valid when the start moves.
+    When a new map arrives, only the cells whose obstacle state changed (and the cells whose distance depends on
+    them) are expanded again, so a replan costs in proportion to the change instead of a search from scratch.
+    Cells are flattened ids (row * cols + col) as in array_a_star.
+    """
+
+    def __init__(self, map_array, start, goal):
+        self.rows, self.cols = map_array.shape
+        self.blocked = (map_array == OBSTACLE_LABEL).ravel()
+        self.start = tuple(start)
+        self.goal = tuple(goal)
+        self._start_id = self._cell_id(self.start)
+        self._goal_id = self._cell_id(self.goal)
+        cells_count = self.rows * self.cols
+        self._g = [inf] * cells_count
+        self._rhs = [inf] * cells_count
+        self._rhs[self._goal_id] = 0
+        # Heap entries are skipped when popped if their key is no longer the cell's key in _open_keys
+        self._open_set = []
+        self._open_keys = {}
+        self._key_modifier = 0
+        self.expansions = 0
+        self._update_cell(self._goal_id)
+
+    def _cell_id(self, cell):
+        return cell[0] * self.cols + cell[1]
+
+    def _heuristic(self, cell_id):
+        row, col = divmod(cell_id, self.cols)
+        return abs(row - self.start[0]) + abs(col - self.start[1])
+
+    def _neighbors(self, cell_id):
+        return grid_neighbors(cell_id, self.rows, self.cols)
+
+    def _cost(self, cell_id, neighbor):
+        return inf if self.blocked[cell_id] or self.blocked[neighbor] else 1
+
+    def _key(self, cell_id):
+        distance = min(self._g[cell_id], self._rhs[cell_id])
+        return distance + self._heuristic(cell_id) + self._key_modifier, distance
+
+    def _best_rhs(self, cell_id):
+        return min((self._cost(cell_id, neighbor) + self._g[neighbor] for neighbor in self._neighbors(cell_id)),
+                   default=inf)
+
+    def _update_cell(self, cell_id):
+        if self._g[cell_id] != self._rhs[cell_id]:
+            key = self._key(cell_id)
+            self._open_keys[cell_id] = key
+            heapq.heappush(self._open_set, (key, cell_id))
+        else:
+            self._open_keys.pop(cell_id, None)
+
+    def _top(self):
+        while self._open_set:
+            key, cell_id = self._open_set[0]
+            if self._open_keys.get(cell_id) == key:
+                return key, cell_id
+            heapq.heappop(self._open_set)
+        return (inf, inf), None
+
+    def compute_shortest_path(self):
+        """
+        Expands cells until the distance of the start is final, returns the number of expanded cells.
+        """
+        expansions = 0
+        while True:
+            key, cell_id = self._top()
+            if cell_id is None or (key >= self._key(self._start_id) and
+                                   self._rhs[self._start_id] == self._g[self._start_id]):
+                break
+            expansions += 1
+            new_key = self._key(cell_id)
+            if key < new_key:
+                self._open_keys[cell_id] = new_key
+                heapq.heappush(self._open_set, (new_key, cell_id))
+            elif self._g[cell_id] > self._rhs[cell_id]:
+                self._g[cell_id] = self._rhs[cell_id]
+                del self._open_keys[cell_id]
+                for neighbor in self._neighbors(cell_id):
+                    if neighbor != self._goal_id:
+                        self._rhs[neighbor] = min(self._rhs[neighbor],
+                                                  self._cost(neighbor, cell_id) + self._g[cell_id])
+                    self._update_cell(neighbor)
+            else:
+                old_g = self._g[cell_id]
+                self._g[cell_id] = inf
+                for neighbor in self._neighbors(cell_id) + [cell_id]:
+                    if neighbor != self._goal_id and (neighbor == cell_id or
+                                                      self._rhs[neighbor] == self._cost(neighbor, cell_id) + old_g):
+                        self._rhs[neighbor] = self._best_rhs(neighbor)
+                    self._update_cell(neighbor)
+        self.expansions += expansions
+        return expansions
+
+    def move_start(self, start):
+        """
+        Moves the start to the jeep's current cell, the distances to the goal stay valid.
+        """
+        start = tuple(start)
+        # Keys computed before the move stay lower bounds by adding the distance the heuristic moved by
+        self._key_modifier += abs(start[0] - self.start[0]) + abs(start[1] - self.start[1])
+        self.start = start
+        self._start_id = self._cell_id(start)
+
+    def update_map(self, map_array):
+        """
+        Applies the cells whose obstacle state differs in a new compressed map of the same arena.
+        Returns the number of changed cells.
+        """
+        if map_array.shape != (self.rows, self.cols):
+            raise ValueError("The map size changed, plan from scratch")
+        blocked = (map_array == OBSTACLE_LABEL).ravel()
+        changed_cells = np.flatnonzero(blocked != self.blocked).tolist()
+        self.blocked = blocked
+        for changed_cell in changed_cells:
+            for cell_id in self._neighbors(changed_cell) + [changed_cell]:
+                if cell_id != self._goal_id:
+                    self._rhs[cell_id] = self._best_rhs(cell_id)
+                self._update_cell(cell_id)
+        return len(changed_cells)
+
+    def path(self):
+        """
+        Returns the list of cells from start to goal, or None if the goal is not reachable.
+        """
+        if self._g[self._start_id] == inf:
+            return None
+        path = [self.start]
+        current = self._start_id
+        while current != self._goal_id:
+            if len(path) > self.rows * self.cols:
+                return None
+            current = min(self._neighbors(current), key=lambda neighbor: self._cost(current, neighbor) +
+                                                                          self._g[neighbor])
+            path.append(divmod(current, self.cols))
+        return path
+
+    def replan(self, map_array=None, start=None):
+        """
+        Repairs the path after the jeep moved to start and/or a new map arrived, and returns the new path.
+        """
+        if start is not None:
+            self.move_start(start)
+        if map_array is not None:
+            self.update_map(map_array)
+        self.compute_shortest_path()
+        return self.path()
+
+
+def d_star_lite(map_array, start, goal, stats=None):
+    """
+    Plans from scratch with DStarLite, same signature and result as a_star.
+    """
+    planner = DStarLite(map_array, start, goal)
+    planner.compute_shortest_path()
+    if stats is not None:
+        stats["expansions"] = planner.expansions
+    return planner.path()
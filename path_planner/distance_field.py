@@ -0,0 +1,93 @@
+from collections import deque
+
+import numpy as np
+
+from config.constants import OBSTACLE_LABEL
+from path_planner.grid_map import grid_neighbors
+
+UNREACHABLE = -1
+
+# Holds the most recent field only, keyed by the map content and the start cell
+_field_cache = {}
+
+
+def _flood(map_array, start):
+    """
+    Breadth first flood from start over the non obstacle cells (every move costs 1).
+    Returns the distance of every cell (UNREACHABLE if not reachable), the flattened id of its parent and the
+    number of expanded cells.
+    """
+    rows, cols = map_array.shape
+    blocked = (map_array == OBSTACLE_LABEL).ravel()
+    distances = np.full(rows * cols, UNREACHABLE, dtype=np.int32)
+    came_from = np.full(rows * cols, -1, dtype=np.int32)
+    start_id = start[0] * cols + start[1]
+    distances[start_id] = 0
+    queue = deque([start_id])
+    expansions = 0
+    while queue:
+        current = queue.popleft()
+        expansions += 1
+        next_distance = distances[current] + 1
+        for neighbor in grid_neighbors(current, rows, cols):
+            if blocked[neighbor] or distances[neighbor] != UNREACHABLE:
+                continue
+            distances[neighbor] = next_distance
+            came_from[neighbor] = current
+            queue.append(neighbor)
+    return distances.reshape(rows, cols), came_from, expansions
+
+
+class DistanceField:
+    """
+    Distances and shortest paths from a single start cell to every cell of a compressed map.
+    The map is flooded once, afterwards every goal is answered by walking the stored parents.
+    """
+
+    def __init__(self, map_array, start):
+        self.start = start
+        self.distances, self._came_from, self.expansions = _flood(map_array, start)
+
+    def distance_to(self, cell):
+        distance = int(self.distances[cell])
+        return None if distance == UNREACHABLE else distance
+
+    def nearest(self, cells):
+        """
+        Returns the reachable cell out of the given (row, col) cells that is closest to the start, or None.
+        """
+        if not len(cells):
+            return None
+        cells = np.asarray(cells)
+        distances = self.distances[cells[:, 0], cells[:, 1]]
+        reachable = np.flatnonzero(distances != UNREACHABLE)
+        if not reachable.size:
+            return None
+        nearest_index = reachable[np.argmin(distances[reachable])]
+        return tuple(int(value) for value in cells[nearest_index])
+
+    def path_to(self, goal):
+        """
+        Returns the list of cells from start to goal, or None if the goal is not reachable.
+        """
+        if self.distance_to(goal) is None:
+            return None
+        cols = self.distances.shape[1]
+        path = []
+        current = goal[0] * cols + goal[1]
+        while current != -1:
+            path.append(divmod(int(current), cols))
+            current = self._came_from[current]
+        path.reverse()
+        return path
+
+
+def get_distance_field(map_array, start):
+    """
+    Returns the DistanceField of the map from start, reusing the previous one when called again with the same map.
+    """
+    key = (tuple(start), map_array.shape, map_array.tobytes())
+    if key not in _field_cache:
+        _field_cache.clear()
+        _field_cache[key] = DistanceField(map_array, tuple(start))
+    return _field_cache[key]
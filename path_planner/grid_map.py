@@ -0,0 +1,259 @@
+from typing import List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+from config.constants import BACKGROUND_LABEL, OBSTACLE_LABEL, DESTINATION_LABEL, COST_MAP_PENALTY, \
+    COST_MAP_PENALTY_RANGE
+
+REDUCTIONS = ("max", "fraction")
+
+
+class GridMetadata(NamedTuple):
+    """
+    Describes how the cells of a compressed map relate to the pixels of the birds eye image it was built from.
+    """
+    step_size: int
+    shape: Tuple[int, int]
+    image_shape: Tuple[int, int]
+
+    def cell_to_pixel(self, cell):
+        """
+        Returns the (x, y) pixel at the center of the given (row, col) cell.
+        """
+        row, col = cell
+        half_step = self.step_size // 2
+        return col * self.step_size + half_step, row * self.step_size + half_step
+
+    def cell_to_pixel_box(self, cell):
+        """
+        Returns the top left and bottom right (x, y) pixels of the given (row, col) cell, clipped to the image.
+        """
+        row, col = cell
+        top_left = (col * self.step_size, row * self.step_size)
+        bottom_right = (min((col + 1) * self.step_size, self.image_shape[1]) - 1,
+                        min((row + 1) * self.step_size, self.image_shape[0]) - 1)
+        return top_left, bottom_right
+
+
+class DestinationRegion(NamedTuple):
+    """
+    A 4-connected group of destination cells.
+    """
+    cells: np.ndarray
+    centroid: Tuple[float, float]
+    goal: Tuple[int, int]
+
+
+class MapLabels(NamedTuple):
+    destinations: List[Tuple[int, int]]
+    obstacles: np.ndarray
+    destination_regions: List[DestinationRegion]
+
+
+def _split_to_blocks(curr_map, shape, step_size, fill_value):
+    """
+    Crops or pads the map to exactly shape * step_size pixels and views it as (rows, step, cols, step) blocks.
+    """
+    rows, cols = shape[0] * step_size, shape[1] * step_size
+    cropped = curr_map[:rows, :cols]
+    if cropped.shape != (rows, cols):
+        cropped = np.pad(cropped, ((0, rows - cropped.shape[0]), (0, cols - cropped.shape[1])),
+                         mode="constant", constant_values=fill_value)
+    return cropped.reshape(shape[0], step_size, shape[1], step_size)
+
+
+def _valid_pixels_per_block(image_shape, shape, step_size):
+    """
+    Counts the pixels of every block that lie inside the image (ragged edge blocks are partially padded).
+    """
+    rows = np.clip(image_shape[0] - np.arange(shape[0]) * step_size, 0, step_size)
+    cols = np.clip(image_shape[1] - np.arange(shape[1]) * step_size, 0, step_size)
+    return np.outer(rows, cols)
+
+
+def block_reduce(curr_map, shape, step_size, reduction="max", threshold=0.0):
+    """
+    Reduces every step_size x step_size block of the map into a single cell in one NumPy pass.
+
+    Parameters:
+    - curr_map: 2D numpy array of 0/1/2 labels.
+    - shape: (rows, cols) of the reduced map. Blocks beyond the image are padded with background.
+    - step_size: int, side of a block in pixels.
+    - reduction: "max" keeps the largest label in the block, "fraction" marks the cell with a label only when
+      more than `threshold` of the block pixels carry it, preferring destination over obstacle over background.
+    - threshold: float in [0, 1), only used by the "fraction" reduction. 0 behaves like "max".
+    """
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction '{reduction}', expected one of {REDUCTIONS}")
+    blocks = _split_to_blocks(curr_map, shape, step_size, fill_value=BACKGROUND_LABEL)
+    if reduction == "max":
+        return blocks.max(axis=(1, 3))
+    valid_pixels = _valid_pixels_per_block(curr_map.shape, shape, step_size)
+    reduced_map = np.full(shape, BACKGROUND_LABEL, dtype=curr_map.dtype)
+    # Lower priority labels are written first so that higher priority labels override them
+    for label in (OBSTACLE_LABEL, DESTINATION_LABEL):
+        label_pixels = np.count_nonzero(blocks == label, axis=(1, 3))
+        reduced_map[label_pixels > threshold * valid_pixels] = label
+    return reduced_map
+
+
+def grid_geometry(map_height, ratio1, ratio2):
+    """
+    Returns the (rows, cols) shape of the compressed map and the step size in pixels of its cells, for a birds eye
+    matrix of the given height.
+    """
+    shape = (int(1 // ratio1) + 1, int(1 // ratio2) + 1)
+    step_size = int(0.9 * map_height * ratio1)
+    if step_size < 1:
+        raise ValueError("The map is too small to be compressed by the given ratio")
+    return shape, step_size
+
+
+def compress_map(curr_map, ratio1, ratio2, reduction="max", threshold=0.0):
+    """
+    Compresses the categorized birds eye matrix into a grid whose cells are roughly the size of the jeep.
+
+    Parameters:
+    - curr_map: 2D numpy array of 0/1/2 labels.
+    - ratio1: float, the jeep size relative to the navigation area height.
+    - ratio2: float, the jeep size relative to the navigation area width.
+    - reduction, threshold: see block_reduce.
+
+    Returns:
+    - compressed_map: 2D numpy array of 0/1/2 labels.
+    - metadata: GridMetadata mapping compressed cells back to image pixels.
+    """
+    shape, step_size = grid_geometry(curr_map.shape[0], ratio1, ratio2)
+    compressed_map = block_reduce(curr_map, shape, step_size, reduction=reduction, threshold=threshold)
+    return compressed_map, GridMetadata(step_size=step_size, shape=shape, image_shape=curr_map.shape[:2])
+
+
+def obstacle_clearance(curr_map):
+    """
+    Returns the clearance layer of a categorized map: for every pixel, the Chebyshev distance in pixels to the
+    nearest obstacle pixel or to the boundary lines just outside the map, as a float32 array. A square footprint of
+    side f centered on a pixel touches no obstacle and stays inside the map when its clearance is above f / 2, so
+    footprint checks are single lookups.
+    """
+    # The blocked border keeps the footprint of the edge cells inside the navigation area, as in cost_map
+    free = np.pad((curr_map != OBSTACLE_LABEL).astype(np.uint8), 1)
+    return cv2.distanceTransform(free, cv2.DIST_C, 3)[1:-1, 1:-1]
+
+
+def clearance_grid(curr_map, cell_size, footprint, clearance=None):
+    """
+    Samples the categorized birds eye matrix on a grid finer than the jeep. A cell is an obstacle when the jeep
+    footprint centered on it would touch an obstacle or leave the map, otherwise it is a destination if it holds
+    destination pixels.
+
+    Parameters:
+    - curr_map: 2D numpy array of 0/1/2 labels.
+    - cell_size: int, side of a cell in pixels.
+    - footprint: (rows, cols) floats, sides of the jeep in pixels.
+    - clearance: the obstacle_clearance of curr_map, computed when not given.
+
+    Returns:
+    - grid_map: 2D numpy array of 0/1/2 labels.
+    - metadata: GridMetadata mapping grid cells back to image pixels.
+    """
+    if cell_size < 1:
+        raise ValueError("The cell size must be at least one pixel")
+    if clearance is None:
+        clearance = obstacle_clearance(curr_map)
+    sizes = curr_map.shape[:2]
+    shape = tuple(-(-size // cell_size) for size in sizes)
+    centers = [np.minimum(np.arange(cells) * cell_size + cell_size // 2, size - 1) for cells, size in zip(shape, sizes)]
+    # A rectangular footprint is covered by squares of its short side spread along its long side, each checked with
+    # a single lookup. The squares are shifted outwards to whole pixels, which may widen the gaps between them by up
+    # to two pixels, so they are spread that much closer
+    square_size = min(footprint)
+    long_axis = int(np.argmax(footprint))
+    half_excess = (footprint[long_axis] - square_size) / 2
+    offsets = np.linspace(-half_excess, half_excess, int(np.ceil(2 * half_excess / max(square_size - 2, 1))) + 1)
+    free = np.ones(shape, dtype=bool)
+    for offset in np.sign(offsets) * np.ceil(np.abs(offsets)):
+        square_centers = list(centers)
+        square_centers[long_axis] = centers[long_axis] + int(offset)
+        # A square centered outside the map leaves it
+        inside = [(0 <= center) & (center < size) for center, size in zip(square_centers, sizes)]
+        rows, cols = [np.clip(center, 0, size - 1) for center, size in zip(square_centers, sizes)]
+        free &= np.outer(*inside) & (clearance[np.ix_(rows, cols)] > square_size / 2)
+    grid_map = np.full(shape, BACKGROUND_LABEL, dtype=np.uint8)
+    grid_map[block_reduce(curr_map, shape, cell_size) == DESTINATION_LABEL] = DESTINATION_LABEL
+    grid_map[~free] = OBSTACLE_LABEL
+    return grid_map, GridMetadata(step_size=cell_size, shape=shape, image_shape=curr_map.shape[:2])
+
+
+def cost_map(map_array, penalty=COST_MAP_PENALTY, penalty_range=COST_MAP_PENALTY_RANGE):
+    """
+    Returns the float32 cost of entering every cell of a map: 1, plus a penalty falling linearly from `penalty` next
+    to an obstacle or the boundary lines down to 0 at `penalty_range` cells away. Obstacles cost inf.
+    The distances come from a single distance transform of the map framed by a blocked border.
+    """
+    if penalty_range <= 1:
+        raise ValueError("The penalty range must be more than one cell")
+    free = np.pad((map_array != OBSTACLE_LABEL).astype(np.uint8), 1, constant_values=0)
+    distances = cv2.distanceTransform(free, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)[1:-1, 1:-1]
+    costs = 1 + penalty * np.clip((penalty_range - distances) / (penalty_range - 1), 0, 1)
+    costs[map_array == OBSTACLE_LABEL] = np.inf
+    return costs.astype(np.float32)
+
+
+def grid_neighbors(cell_id, rows, cols):
+    """
+    Returns the flattened ids (row * cols + col) of the 4-connected neighbors of a cell inside a rows x cols map.
+    """
+    row, col = divmod(cell_id, cols)
+    neighbors = []
+    if row > 0:
+        neighbors.append(cell_id - cols)
+    if row < rows - 1:
+        neighbors.append(cell_id + cols)
+    if col > 0:
+        neighbors.append(cell_id - 1)
+    if col < cols - 1:
+        neighbors.append(cell_id + 1)
+    return neighbors
+
+
+def find_label_cells(map_array, label):
+    """
+    Returns an (N, 2) array of the (row, col) cells holding the given label, in row major order.
+    """
+    return np.argwhere(map_array == label)
+
+
+def find_destination_regions(map_array):
+    """
+    Groups the destination cells into 4-connected regions, largest region first.
+    The goal of every region is its cell closest to the centroid, so it always lies inside the region.
+    """
+    destination_mask = (map_array == DESTINATION_LABEL).astype(np.uint8)
+    regions_count, region_ids, _, centroids = cv2.connectedComponentsWithStats(destination_mask, connectivity=4)
+    if regions_count == 1:
+        return []
+    cells = np.argwhere(region_ids > 0)
+    cell_region_ids = region_ids[cells[:, 0], cells[:, 1]]
+    # Sorting the cells by region id lets every region be sliced out of a single array
+    order = np.argsort(cell_region_ids, kind="stable")
+    region_sizes = np.bincount(cell_region_ids, minlength=regions_count)[1:]
+    region_cells = np.split(cells[order], np.cumsum(region_sizes)[:-1])
+    regions = []
+    for region_id, cells_of_region in enumerate(region_cells, start=1):
+        # OpenCV returns (x, y) centroids
+        centroid = (float(centroids[region_id][1]), float(centroids[region_id][0]))
+        closest = np.argmin(np.abs(cells_of_region - centroid).sum(axis=1))
+        goal = (int(cells_of_region[closest][0]), int(cells_of_region[closest][1]))
+        regions.append(DestinationRegion(cells=cells_of_region, centroid=centroid, goal=goal))
+    regions.sort(key=lambda region: len(region.cells), reverse=True)
+    return regions
+
+
+def extract_labels(map_array):
+    """
+    Extracts the destination cells, the obstacle cells and the connected destination regions of a map.
+    """
+    return MapLabels(destinations=[tuple(cell) for cell in find_label_cells(map_array, DESTINATION_LABEL).tolist()],
+                     obstacles=find_label_cells(map_array, OBSTACLE_LABEL),
+                     destination_regions=find_destination_regions(map_array))
@@ -4,41 +4,36 @@ import cv2
 import numpy as np
 
 from config.constants import BOUNDARIES_LOWER_BOUND1, BOUNDARIES_UPPER_BOUND1, BOUNDARIES_LOWER_BOUND2, \
-    BOUNDARIES_UPPER_BOUND2, NAVIGATION_AREA_HEIGHT, JEEP_SIZE, NAVIGATION_AREA_WIDTH
-from image_processing.birds_eye import apply_birds_eye, plot_birds_eye_view, plot_path_on_birds_eye_image
+    BOUNDARIES_UPPER_BOUND2, NAVIGATION_AREA_HEIGHT, JEEP_SIZE, NAVIGATION_AREA_WIDTH, OBSTACLE_LABEL, \
+    DESTINATION_LABEL, JEEP_HEIGHT, JEEP_WIDTH
+from image_processing.birds_eye import apply_birds_eye, plot_birds_eye_view, plot_path_on_birds_eye_image, \
+    get_birds_eye_size, plot_segments_on_birds_eye_image, apply_min_pooled_birds_eye
+from image_processing.plot_utils import plots_enabled
 from image_processing.postprocess import plot_heatmap_over_image
 from image_processing.preprocess import find_boundaries, plot_img_with_boundaries, order_boundaries, \
     convert_birds_eye_image_to_matrix
-
+from path_planner.d_star_lite import d_star_lite
+from path_planner.distance_field import get_distance_field
+from path_planner.grid_map import compress_map, find_label_cells, grid_geometry, block_reduce, clearance_grid, \
+    cost_map, grid_neighbors
+from path_planner.path_smoothing import path_to_segments
 
 def compress_map_by_ratio(curr_map, ratio1, ratio2):
-    n, m = curr_map.shape
-    compressed_n, compressed_m = int(1 // ratio1) + 1, int(1 // ratio2) + 1
-    compressed_map = np.zeros((compressed_n, compressed_m), dtype=int)
-    k = int(0.9 * n * ratio1)
-    for i in range(compressed_n):
-        for j in range(compressed_m):
-            subarray = curr_map[i * k:(i + 1) * k, j * k:(j + 1) * k]
-            compressed_map[i, j] = subarray.max()
-    return compressed_map, k
+    compressed_map, metadata = compress_map(curr_map, ratio1, ratio2)
+    return compressed_map, metadata.step_size
 
 
 def find_destinations(map_array):
-    destinations = []
-    rows, cols = map_array.shape
-    for i in range(rows):
-        for j in range(cols):
-            if map_array[i, j] == 2:
-                destinations.append((i, j))
-    return destinations
+    return [tuple(cell) for cell in find_label_cells(map_array, DESTINATION_LABEL).tolist()]
 
 
 def heuristic(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
 
-def a_star(map_array, start, goal):
+def a_star(map_array, start, goal, stats=None):
     rows, cols = map_array.shape
+    expansions = 0
     open_set = []
     heapq.heappush(open_set, (0, start))
     came_from = {}
@@ -46,6 +41,9 @@ def a_star(map_array, start, goal):
     f_score = {start: heuristic(start, goal)}
     while open_set:
         current = heapq.heappop(open_set)[1]
+        expansions += 1
+        if stats is not None:
+            stats["expansions"] = expansions
         if current == goal:
             path = []
             while current in came_from:
@@ -67,6 +65,195 @@ def a_star(map_array, start, goal):
     return None
 
 
+def _flat_path_to_cells(came_from, goal_id, cols):
+    path = []
+    current = goal_id
+    while current != -1:
+        path.append(divmod(int(current), cols))
+        current = came_from[current]
+    path.reverse()
+    return path
+
+
+def _flat_a_star(map_array, start, goal, flat_costs, stats=None):
+    """
+    A* over preallocated arrays indexed by the flattened cell id (row * cols + col), where entering a cell costs its
+    entry in flat_costs (inf for obstacles). Every cost must be at least 1 for the Manhattan heuristic to stay
+    admissible.
+    """
+    rows, cols = map_array.shape
+    expansions = 0
+    # Indexing a list is much faster than indexing an array for a single element
+    flat_costs = flat_costs.tolist()
+    g_score = np.full(rows * cols, np.inf, dtype=np.float32)
+    came_from = np.full(rows * cols, -1, dtype=np.int32)
+    closed = np.zeros(rows * cols, dtype=bool)
+    start_id = start[0] * cols + start[1]
+    goal_id = goal[0] * cols + goal[1]
+    g_score[start_id] = 0
+    open_set = [(heuristic(start, goal), start_id)]
+    while open_set:
+        current = heapq.heappop(open_set)[1]
+        if closed[current]:
+            continue
+        expansions += 1
+        if stats is not None:
+            stats["expansions"] = expansions
+        if current == goal_id:
+            return _flat_path_to_cells(came_from, goal_id, cols)
+        closed[current] = True
+        current_g_score = g_score[current]
+        for neighbor in grid_neighbors(current, rows, cols):
+            tentative_g_score = current_g_score + flat_costs[neighbor]
+            if closed[neighbor] or tentative_g_score >= g_score[neighbor]:
+                continue
+            came_from[neighbor] = current
+            g_score[neighbor] = tentative_g_score
+            neighbor_row, neighbor_col = divmod(neighbor, cols)
+            f_score = float(tentative_g_score) + abs(neighbor_row - goal[0]) + abs(neighbor_col - goal[1])
+            heapq.heappush(open_set, (f_score, neighbor))
+    return None
+
+
+def array_a_star(map_array, start, goal, stats=None):
+    """
+    A* over preallocated arrays indexed by the flattened cell id (row * cols + col).
+    Scores and parents are arrays, expanded cells are marked in a closed-set bitmap and outdated heap entries are
+    skipped when popped (lazy deletion) instead of being tracked in dictionaries. Every move costs 1, the search is
+    the one of cost_map_a_star.
+    Same signature and result as a_star.
+    """
+    unit_costs = np.where(map_array == OBSTACLE_LABEL, np.inf, 1).astype(np.float32)
+    return _flat_a_star(map_array, start, goal, unit_costs.ravel(), stats)
+
+
+def cost_map_a_star(map_array, start, goal, stats=None, costs=None):
+    """
+    A* over a cost map (see grid_map.cost_map): entering a cell costs its float32 cost instead of 1, so the path
+    keeps away from obstacles and the boundary lines when a slightly longer path allows it. Every cost is at least 1,
+    so the Manhattan heuristic stays admissible. Arrays and lazy deletion as in array_a_star.
+    Same signature and result as a_star, costs are computed from the map when not given.
+    """
+    if costs is None:
+        costs = cost_map(map_array)
+    return _flat_a_star(map_array, start, goal, costs.ravel(), stats)
+
+
+def _jump_horizontally(free, row, col, d_col, goal):
+    """
+    Scans along the row until reaching the goal, a blocked cell (None) or a cell with a forced vertical neighbor.
+    """
+    while True:
+        col += d_col
+        if not free[row, col]:
+            return None
+        if (row, col) == goal:
+            return row, col
+        for d_row in (-1, 1):
+            if free[row + d_row, col] and not free[row + d_row, col - d_col]:
+                return row, col
+
+
+def _jump_vertically(free, row, col, d_row, goal):
+    """
+    Scans along the column until reaching the goal, a blocked cell (None) or a cell from which a horizontal scan
+    finds a jump point.
+    """
+    while True:
+        row += d_row
+        if not free[row, col]:
+            return None
+        if (row, col) == goal:
+            return row, col
+        if _jump_horizontally(free, row, col, -1, goal) or _jump_horizontally(free, row, col, 1, goal):
+            return row, col
+
+
+def _jump_directions(free, node, parent):
+    """
+    Returns the pruned (d_row, d_col) directions to scan from node, given the jump point it was reached from.
+    Canonical paths move vertically first, so horizontal moves only turn vertically at forced neighbors.
+    """
+    if parent is None:
+        return [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    row, col = node
+    d_row = (row > parent[0]) - (row < parent[0])
+    d_col = (col > parent[1]) - (col < parent[1])
+    if d_row:
+        return [(d_row, 0), (0, -1), (0, 1)]
+    directions = [(0, d_col)]
+    for forced_d_row in (-1, 1):
+        if free[row + forced_d_row, col] and not free[row + forced_d_row, col - d_col]:
+            directions.append((forced_d_row, 0))
+    return directions
+
+
+def _expand_jump_points(jump_points):
+    path = [jump_points[0]]
+    for (row, col), (next_row, next_col) in zip(jump_points, jump_points[1:]):
+        d_row = (next_row > row) - (next_row < row)
+        d_col = (next_col > col) - (next_col < col)
+        while (row, col) != (next_row, next_col):
+            row, col = row + d_row, col + d_col
+            path.append((row, col))
+    return path
+
+
+def jump_point_search(map_array, start, goal, stats=None):
+    """
+    Jump Point Search for uniform-cost 4-connected grids.
+    Instead of pushing every neighbor, straight lines are scanned until a jump point (the goal, or a cell where the
+    path may have to turn) and only jump points enter the open set, skipping the symmetric paths a_star expands.
+    Same signature and result as a_star.
+    """
+    # A blocked border removes the bounds checks from the scans, cells are shifted by one
+    free = np.pad(map_array != OBSTACLE_LABEL, 1, constant_values=False)
+    start = (start[0] + 1, start[1] + 1)
+    goal = (goal[0] + 1, goal[1] + 1)
+    expansions = 0
+    open_set = [(heuristic(start, goal), start)]
+    came_from = {start: None}
+    g_score = {start: 0}
+    closed = set()
+    while open_set:
+        current = heapq.heappop(open_set)[1]
+        if current in closed:
+            continue
+        expansions += 1
+        if stats is not None:
+            stats["expansions"] = expansions
+        if current == goal:
+            jump_points = []
+            while current is not None:
+                jump_points.append((current[0] - 1, current[1] - 1))
+                current = came_from[current]
+            jump_points.reverse()
+            return _expand_jump_points(jump_points)
+        closed.add(current)
+        for d_row, d_col in _jump_directions(free, current, came_from[current]):
+            if d_row:
+                jump_point = _jump_vertically(free, current[0], current[1], d_row, goal)
+            else:
+                jump_point = _jump_horizontally(free, current[0], current[1], d_col, goal)
+            if jump_point is None or jump_point in closed:
+                continue
+            tentative_g_score = g_score[current] + heuristic(current, jump_point)
+            if jump_point not in g_score or tentative_g_score < g_score[jump_point]:
+                came_from[jump_point] = current
+                g_score[jump_point] = tentative_g_score
+                heapq.heappush(open_set, (tentative_g_score + heuristic(jump_point, goal), jump_point))
+    return None
+
+
+PLANNERS = {
+    "a_star": a_star,
+    "array_a_star": array_a_star,
+    "jps": jump_point_search,
+    "d_star_lite": d_star_lite,
+    "cost_map_a_star": cost_map_a_star,
+}
+
+
 def path_to_directions(path):
     directions = []
     for i in range(1, len(path)):
@@ -83,18 +270,40 @@ def path_to_directions(path):
     return directions
 
 
-def plan_path(birds_eye_img, start):
-    compressed_map, step_size = compress_map_by_ratio(birds_eye_img, JEEP_SIZE / NAVIGATION_AREA_HEIGHT,
-                                                      JEEP_SIZE / NAVIGATION_AREA_WIDTH)
+# None plans one direction per cell, "merge" merges straight runs into single segments and "any_angle" also cuts
+# corners where the jeep has line of sight
+SMOOTHING_MODES = (None, "merge", "any_angle")
+
+
+def plan_compressed_path(compressed_map, start, planner="a_star", nearest_destination=False, smoothing=None):
+    """
+    Plans a path from start to a destination cell of the compressed map and returns its directions, or its
+    (rows, cols) segments when smoothing is set.
+    By default the first destination found is planned with the given planner. With nearest_destination the map is
+    flooded once from start and the closest reachable destination is taken straight from the distance field.
+    """
+    if planner not in PLANNERS:
+        raise ValueError(f"Unknown planner '{planner}', expected one of {tuple(PLANNERS)}")
+    if smoothing not in SMOOTHING_MODES:
+        raise ValueError(f"Unknown smoothing '{smoothing}', expected one of {SMOOTHING_MODES}")
     print(compressed_map)
     destinations = find_destinations(compressed_map)
-    # Assuming we only have one destination in the map for simplicity.
     if destinations:
-        goal = destinations[0]
-        path = a_star(compressed_map, start, goal)
+        if nearest_destination:
+            distance_field = get_distance_field(compressed_map, start)
+            print(f"flood expanded {distance_field.expansions} cells")
+            goal = distance_field.nearest(destinations)
+            path = distance_field.path_to(goal) if goal else None
+        else:
+            # Assuming we only have one destination in the map for simplicity.
+            goal = destinations[0]
+            stats = {}
+            path = PLANNERS[planner](compressed_map, start, goal, stats=stats)
+            print(f"{planner} expanded {stats.get('expansions', 0)} cells")
         if path:
-            directions = path_to_directions(path)
-            return directions, step_size
+            if smoothing is None:
+                return path_to_directions(path)
+            return path_to_segments(path, compressed_map if smoothing == "any_angle" else None)
         else:
             print("No path found.")
     else:
@@ -102,16 +311,99 @@ def plan_path(birds_eye_img, start):
     return None
 
 
-def create_navigation_directions(img_path):
-    image = cv2.imread(img_path)
+def plan_path(birds_eye_img, start, planner="a_star", nearest_destination=False, smoothing=None):
+    compressed_map, step_size = compress_map_by_ratio(birds_eye_img, JEEP_SIZE / NAVIGATION_AREA_HEIGHT,
+                                                      JEEP_SIZE / NAVIGATION_AREA_WIDTH)
+    directions = plan_compressed_path(compressed_map, start, planner=planner, nearest_destination=nearest_destination,
+                                      smoothing=smoothing)
+    if directions is None:
+        return None
+    return directions, step_size
+
+
+def plan_from_frame(frame, planner="a_star", nearest_destination=False, grid_oversample=None, smoothing=None,
+                    clearance_subdivisions=None, warp_cache=None):
+    """
+    Runs the whole pipeline on an in-memory frame and returns the jeep directions, or segments with smoothing (see
+    plan_compressed_path).
+    The frame is either BGR (as loaded by OpenCV) or RGBA (as captured by DroneController).
+    Returns None when no path to a destination is found.
+    With grid_oversample, the image is warped straight into a view of grid_oversample pixels per compressed map cell
+    and classified at that size, instead of warping and classifying at full resolution and compressing afterwards.
+    The view is min-pooled (see apply_min_pooled_birds_eye) so that obstacles thinner than the samples' spacing are
+    still seen, which may also block the cells up to the sampling radius around an obstacle and lets obstacles win
+    over destinations next to them.
+    With clearance_subdivisions, the path is planned on a grid of clearance_subdivisions cells per jeep-size cell
+    side, blocking the cells where the JEEP_HEIGHT x JEEP_WIDTH footprint of the jeep, facing up, touches an obstacle
+    (see clearance_grid). The segments are still returned in jeep-size cells, so they may be fractional.
+    A BirdsEyeWarpCache shared by the calls speeds up planning many frames of the same arena, a single frame is
+    faster without one.
+    """
+    if clearance_subdivisions and smoothing is None:
+        raise ValueError("Planning on a clearance grid needs smoothing, directions move by whole jeep-size cells")
+    image = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR) if frame.shape[2] == 4 else frame
     boundaries = find_boundaries(image, BOUNDARIES_LOWER_BOUND1, BOUNDARIES_UPPER_BOUND1, BOUNDARIES_LOWER_BOUND2,
                                  BOUNDARIES_UPPER_BOUND2)
     plot_img_with_boundaries(image, boundaries)  # Plot the original image with the detected boundaries
     ord_boundaries = order_boundaries(boundaries)
-    birds_eye_img = apply_birds_eye(image, ord_boundaries)
+    if grid_oversample:
+        _, birds_eye_height = get_birds_eye_size(ord_boundaries)
+        shape, step_size = grid_geometry(birds_eye_height, JEEP_SIZE / NAVIGATION_AREA_HEIGHT,
+                                         JEEP_SIZE / NAVIGATION_AREA_WIDTH)
+        scale = grid_oversample / step_size
+        categorized_img_matrix = convert_birds_eye_image_to_matrix(
+            apply_min_pooled_birds_eye(image, ord_boundaries, scale))
+        # The pooled view is darker than the scene, the plots show a plain one
+        birds_eye_img = apply_birds_eye(image, ord_boundaries, warp_cache=warp_cache, scale=scale,
+                                        interpolation=cv2.INTER_NEAREST) if plots_enabled() else None
+        step_size = grid_oversample
+    else:
+        birds_eye_img = apply_birds_eye(image, ord_boundaries, warp_cache=warp_cache)
+        categorized_img_matrix = convert_birds_eye_image_to_matrix(birds_eye_img)
     plot_birds_eye_view(birds_eye_img)  # Plot the birds eye image
-    categorized_img_matrix = convert_birds_eye_image_to_matrix(birds_eye_img)
     plot_heatmap_over_image(birds_eye_img, categorized_img_matrix)
-    direction_array, step_size = plan_path(categorized_img_matrix, start=(0, 0))
-    plot_path_on_birds_eye_image(birds_eye_img, direction_array, step_size=step_size)
+    if clearance_subdivisions:
+        if not grid_oversample:
+            _, step_size = grid_geometry(categorized_img_matrix.shape[0], JEEP_SIZE / NAVIGATION_AREA_HEIGHT,
+                                         JEEP_SIZE / NAVIGATION_AREA_WIDTH)
+        cell_size = step_size // clearance_subdivisions
+        # The real jeep in pixels, facing up. step_size is a shrunk jeep-size cell, only used to scale the segments
+        footprint = (JEEP_HEIGHT * categorized_img_matrix.shape[0] / NAVIGATION_AREA_HEIGHT,
+                     JEEP_WIDTH * categorized_img_matrix.shape[1] / NAVIGATION_AREA_WIDTH)
+        grid_map, _ = clearance_grid(categorized_img_matrix, cell_size, footprint)
+        # The jeep enters the navigation area in its corner, at the first cell where it does not reach past the
+        # boundary lines
+        start = tuple(int(np.ceil(max(size / 2 - cell_size // 2, 0) / cell_size)) for size in footprint)
+        segments = plan_compressed_path(grid_map, start=start, planner=planner,
+                                        nearest_destination=nearest_destination, smoothing=smoothing)
+        if segments is None:
+            return None
+        plot_segments_on_birds_eye_image(birds_eye_img, segments, step_size=cell_size, start=start)
+        return [(rows * cell_size / step_size, cols * cell_size / step_size) for rows, cols in segments]
+    if grid_oversample:
+        compressed_map = block_reduce(categorized_img_matrix, shape, grid_oversample)
+        direction_array = plan_compressed_path(compressed_map, start=(0, 0), planner=planner,
+                                               nearest_destination=nearest_destination, smoothing=smoothing)
+        if direction_array is None:
+            return None
+    else:
+        planned_path = plan_path(categorized_img_matrix, start=(0, 0), planner=planner,
+                                 nearest_destination=nearest_destination, smoothing=smoothing)
+        if planned_path is None:
+            return None
+        direction_array, step_size = planned_path
+    if smoothing is None:
+        plot_path_on_birds_eye_image(birds_eye_img, direction_array, step_size=step_size)
+    else:
+        plot_segments_on_birds_eye_image(birds_eye_img, direction_array, step_size=step_size)
     return direction_array
+
+
+def create_navigation_directions(img_path, planner="a_star", nearest_destination=False, grid_oversample=None,
+                                 smoothing=None, clearance_subdivisions=None):
+    image = cv2.imread(img_path)
+    if image is None:
+        raise ValueError("Image not loaded properly")
+    return plan_from_frame(image, planner=planner, nearest_destination=nearest_destination,
+                           grid_oversample=grid_oversample, smoothing=smoothing,
+                           clearance_subdivisions=clearance_subdivisions)
@@ -0,0 +1,96 @@
+import numpy as np
+
+from config.constants import OBSTACLE_LABEL
+
+# (row, col) step of every direction, rows grow Down and columns grow Right
+DIRECTION_STEPS = {'Up': (-1, 0), 'Down': (1, 0), 'Left': (0, -1), 'Right': (0, 1)}
+
+
+def directions_to_path(directions, start=(0, 0)):
+    path = [tuple(start)]
+    for direction in directions:
+        d_row, d_col = DIRECTION_STEPS[direction]
+        path.append((path[-1][0] + d_row, path[-1][1] + d_col))
+    return path
+
+
+def merge_straight_runs(path):
+    """
+    Keeps only the cells of the path where it turns, so every straight run becomes a single move.
+    """
+    if len(path) < 3:
+        return list(path)
+    waypoints = [path[0]]
+    for previous_cell, cell, next_cell in zip(path, path[1:], path[2:]):
+        if (cell[0] - previous_cell[0], cell[1] - previous_cell[1]) != (next_cell[0] - cell[0], next_cell[1] - cell[1]):
+            waypoints.append(cell)
+    waypoints.append(path[-1])
+    return waypoints
+
+
+def has_line_of_sight(free, a, b):
+    """
+    Whether the jeep can drive straight from the center of cell a to the center of cell b.
+    The jeep takes a whole cell, so it sweeps every cell less than one cell away (on both axes) from the segment
+    between the centers, and all of those must be free. A segment passing exactly between two cells touches neither.
+
+    :param free: Boolean map of the cells the jeep can enter.
+    """
+    (start_row, start_col), (end_row, end_col) = a, b
+    min_row, max_row = min(start_row, end_row), max(start_row, end_row)
+    min_col, max_col = min(start_col, end_col), max(start_col, end_col)
+    rows, cols = np.mgrid[min_row:max_row + 1, min_col:max_col + 1]
+    # Part of the segment (as a fraction of its length) during which the jeep overlaps every cell of the bounding box
+    enter = np.zeros(rows.shape)
+    leave = np.ones(rows.shape)
+    for start, delta, centers in ((start_row, end_row - start_row, rows), (start_col, end_col - start_col, cols)):
+        if delta == 0:
+            leave[centers != start] = -1
+            continue
+        bound1 = (centers - 1 - start) / delta
+        bound2 = (centers + 1 - start) / delta
+        enter = np.maximum(enter, np.minimum(bound1, bound2))
+        leave = np.minimum(leave, np.maximum(bound1, bound2))
+    swept = enter < leave
+    return bool(free[min_row:max_row + 1, min_col:max_col + 1][swept].all())
+
+
+def any_angle_path(path, map_array):
+    """
+    Shortens a grid path into straight segments at any angle (Theta*-style post-processing): from every waypoint the
+    path jumps to the furthest later cell in line of sight.
+    """
+    free = map_array != OBSTACLE_LABEL
+    waypoints = [path[0]]
+    anchor = 0
+    while anchor < len(path) - 1:
+        furthest = anchor + 1
+        for index in range(anchor + 2, len(path)):
+            if not has_line_of_sight(free, path[anchor], path[index]):
+                break
+            furthest = index
+        waypoints.append(path[furthest])
+        anchor = furthest
+    return waypoints
+
+
+def waypoints_to_segments(waypoints):
+    """
+    :return: list of (rows, cols) moves between consecutive waypoints.
+    """
+    return [(cell[0] - previous_cell[0], cell[1] - previous_cell[1])
+            for previous_cell, cell in zip(waypoints, waypoints[1:])]
+
+
+def path_to_segments(path, map_array=None):
+    """
+    Converts a grid path into straight (rows, cols) segments, each driven as a single move.
+    Straight runs of the path are merged, and with the map the path is also shortened by any-angle segments.
+    """
+    if map_array is None:
+        return waypoints_to_segments(merge_straight_runs(path))
+    return waypoints_to_segments(any_angle_path(path, map_array))
+
+
+def directions_to_segments(directions):
+    return path_to_segments(directions_to_path(directions))